@@ -1,15 +1,32 @@
 from fastapi import APIRouter, Request, Depends
 import pydantic_geojson as pg
 import geopandas as gpd
-from ...utils import decorators, auth, const
+from ...utils import decorators, auth, const, serialization, ingest
 from . import blocks_models, blocks_service
 
-router = APIRouter(prefix='/blocks', tags=['Blocks'])
+router = APIRouter(prefix='/blocks', tags=['Blocks'], route_class=ingest.FastIngestRoute)
 
-@router.post('/generate', deprecated=True)
+def _get_body_road_network(request : Request) -> gpd.GeoDataFrame | None:
+    # binary body or JSON body in fast ingest mode, FastAPI leaves the road_network parameter empty for them
+    binary_body = getattr(request.state, 'binary_body', None)
+    if binary_body:
+        return serialization.gdf_from_binary(binary_body)
+    json_body = getattr(request.state, 'json_body', None)
+    if json_body:
+        return ingest.read_feature_collection(ingest.loads(json_body), (), ingest.LINE_TYPES)
+    return None
+
+@router.post('/generate', deprecated=True, responses=serialization.BINARY_RESPONSES)
 @decorators.gdf_to_geojson
-def generate_blocks(project_id : int, token : str = Depends(auth.verify_token), road_network : blocks_models.RoadNetworkModel | None = None) -> blocks_models.BlocksModel:
-    if road_network is not None:
+def generate_blocks(
+        project_id : int,
+        token : str = Depends(auth.verify_token),
+        road_network : blocks_models.RoadNetworkModel | None = None,
+        body_road_network_gdf : gpd.GeoDataFrame | None = Depends(_get_body_road_network)
+    ) -> blocks_models.BlocksModel:
+    if body_road_network_gdf is not None:
+        road_network_gdf = body_road_network_gdf
+    elif road_network is not None:
         road_network_gdf = gpd.GeoDataFrame.from_features([f.model_dump() for f in road_network.features], const.DEFAULT_CRS)
     else:
         road_network_gdf = None
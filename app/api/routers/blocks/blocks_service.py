@@ -3,8 +3,9 @@ import shapely
 import geopandas as gpd
 from loguru import logger
 from blocksnet.preprocessing.blocks_generator import BlocksGenerator
-from ...utils import api_client, const
+from ...utils import api_client, const, tracing
 
+@tracing.trace
 def _get_project_geometry(project_id : int, token):
     project_info = api_client.get_project_by_id(project_id, token)
     geometry_json = json.dumps(project_info['geometry'])
@@ -13,6 +14,7 @@ def _get_project_geometry(project_id : int, token):
 def _fetch_water_objects(project_id : int, token : str):
     return None
 
+@tracing.trace
 def generate_blocks(project_id : int, token : str, roads_gdf : gpd.GeoDataFrame | None = None, ):
     
     logger.info('Fetching project geometry')
@@ -30,4 +32,5 @@ def generate_blocks(project_id : int, token : str, roads_gdf : gpd.GeoDataFrame
     
     logger.info('Initializing BlocksGenerator')
     bg = BlocksGenerator(project_gdf.to_crs(local_crs), roads_gdf, None, water_gdf)
-    return bg.run()
\ No newline at end of file
+    with tracing.span('blocks', 'blocks_generator', (roads_gdf,)):
+        return bg.run()
\ No newline at end of file
@@ -1,8 +1,10 @@
 from enum import Enum
 import shapely
+import numpy as np
+import pandas as pd
 import geopandas as gpd
 from blocksnet import LandUse
-from pydantic import BaseModel, InstanceOf
+from ...utils import tracing
 
 class ResidentialType(Enum):
     HIGH_RISE = 'МКД'
@@ -31,61 +33,16 @@ LAND_USE_GSIS = {
 
 METERS_IN_HECTARE = 10_000
 
-class Block(BaseModel):
-    geometry : InstanceOf[shapely.Polygon] | InstanceOf[shapely.MultiPolygon]
-    land_use : LandUse | None
-    residential_type : ResidentialType | None
+# lookup tables of minimal FSI and GSI by land use value
+LAND_USE_FSIS_VALUES = {lu.value : fsi[0] for lu, fsi in LAND_USE_FSIS.items()}
+LAND_USE_GSIS_VALUES = {lu.value : gsi[0] for lu, gsi in LAND_USE_GSIS.items()}
 
-    @property
-    def area_m2(self):
-        return self.geometry.area
-    
-    @property
-    def area_ha(self):
-        return self.area_m2 / METERS_IN_HECTARE
-    
-    @property
-    def fsi(self):
-        land_use = self.land_use
-        residential_type = self.residential_type
-        if land_use == LandUse.RESIDENTIAL:
-            if residential_type == ResidentialType.HIGH_RISE:
-                return 0.7
-            if residential_type == ResidentialType.MID_RISE:
-                return 0.35
-            if residential_type == ResidentialType.LOW_RISE:
-                return 0.2
-        if LandUse is None:
-            return sum(v[0] for v in LAND_USE_FSIS.values()) / len(LAND_USE_FSIS)
-        return LAND_USE_FSIS[land_use][0]
-    
-    @property
-    def gsi(self):
-        land_use = self.land_use
-        if LandUse is None:
-            return sum(v[0] for v in LAND_USE_GSIS.values()) / len(LAND_USE_GSIS)
-        return LAND_USE_GSIS[land_use][0]
-    
-    @property
-    def footprint_area(self):
-        return self.area_m2 * self.gsi
+RESIDENTIAL_TYPE_FSIS = {
+    ResidentialType.HIGH_RISE: 0.7,
+    ResidentialType.MID_RISE: 0.35,
+    ResidentialType.LOW_RISE: 0.2,
+}
 
-    @property
-    def build_floor_area(self):
-        return self.area_m2 * self.fsi
-    
-    @property
-    def residential_area(self):
-        if self.land_use == LandUse.RESIDENTIAL:
-            return self.build_floor_area * 0.7
-        return 0
-    
-    @property
-    def non_residential_area(self):
-        if self.land_use == LandUse.RESIDENTIAL:
-            return self.build_floor_area * 0.3
-        return self.build_floor_area
-    
 TERRITORY_AREA_HA_KEY = 'Площадь рассматриваемой территории (га)'
 TERRITORY_AREA_M2_KEY = 'Площадь рассматриваемой территории (м2)'
 
@@ -122,9 +79,32 @@ SHARES_KEYS = {
 }
 
 
-class BlocksContainer(BaseModel):
-    area : float
-    blocks : list[Block]
+def _sum(values : np.ndarray) -> float:
+    # sequential python sum keeps results identical to summing per block values one by one
+    return sum(values.tolist())
+
+# per block values are computed once as arrays, indicators are derived from their totals
+class BlocksContainer:
+
+    def __init__(self, area : float, areas : np.ndarray, land_uses : np.ndarray, residential_type : ResidentialType | None):
+        self.area = float(area)
+
+        land_uses = pd.Series(land_uses)
+        fsis = land_uses.map(LAND_USE_FSIS_VALUES).to_numpy(dtype=float, copy=True)
+        gsis = land_uses.map(LAND_USE_GSIS_VALUES).to_numpy(dtype=float)
+        is_residential = (land_uses == LandUse.RESIDENTIAL.value).to_numpy()
+        if residential_type is not None:
+            fsis[is_residential] = RESIDENTIAL_TYPE_FSIS[residential_type]
+
+        build_floor_areas = areas * fsis
+        residential_areas = np.where(is_residential, build_floor_areas * 0.7, 0)
+        non_residential_areas = np.where(is_residential, build_floor_areas * 0.3, build_floor_areas)
+
+        self.footprint_area = _sum(areas * gsis)
+        self.build_floor_area = _sum(build_floor_areas)
+        self.residential_area = _sum(residential_areas)
+        self.non_residential_area = _sum(non_residential_areas)
+        self.lu_areas = {lu : _sum(areas[(land_uses == lu.value).to_numpy()]) for lu in SHARES_KEYS}
 
     @property
     def area_ha(self):
@@ -138,26 +118,10 @@ class BlocksContainer(BaseModel):
     def gsi(self):
         return self.footprint_area / self.area_m2
     
-    @property
-    def footprint_area(self):
-        return sum(b.footprint_area for b in self.blocks)
-    
     @property
     def fsi(self):
         return self.build_floor_area / self.area_m2
     
-    @property
-    def build_floor_area(self):
-        return sum(b.build_floor_area for b in self.blocks)
-    
-    @property
-    def residential_area(self):
-        return sum(b.residential_area for b in self.blocks)
-    
-    @property
-    def non_residential_area(self):
-        return sum(b.non_residential_area for b in self.blocks)
-    
     @property
     def population(self):
         return self.residential_area / 50
@@ -203,8 +167,7 @@ class BlocksContainer(BaseModel):
         return self.population / 1000 * 300
     
     def _get_share(self, lu : LandUse):
-        area = sum([block.area_m2 for block in self.blocks if block.land_use == lu])
-        return area/self.area_m2
+        return self.lu_areas[lu]/self.area_m2
 
     @property
     def share_indicators(self):
@@ -234,9 +197,10 @@ class BlocksContainer(BaseModel):
             PROVISION_COMMERCE_KEY : round(self.provision_commerce),
         }
     
+@tracing.trace
 def get_indicators(gdf : gpd.GeoDataFrame, land_use_column : str, residential_type : ResidentialType | None, area : float | None):
     gdf = gdf[gdf[land_use_column].isin([lu.value for lu in list(LandUse)])]
-    gdf = gdf[['geometry', land_use_column]].rename(columns={land_use_column : 'land_use'})
-    blocks = [Block(**row, residential_type = residential_type) for _,row in gdf.iterrows()]
-    blocks_container = BlocksContainer(blocks=blocks, area= gdf.area.sum() if area is None else area)
+    areas = shapely.area(gdf.geometry.values.to_numpy())
+    land_uses = gdf[land_use_column].to_numpy()
+    blocks_container = BlocksContainer(gdf.area.sum() if area is None else area, areas, land_uses, residential_type)
     return blocks_container.get_indicators()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import json
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 import geopandas as gpd
 from ...utils import const, auth
 from . import indicators_service
@@ -7,8 +8,20 @@ from . import indicators_service
 router = APIRouter(prefix='/indicators', tags=['Indicators'])
 
 @router.post('/predict')
-def predict(
+async def predict(
         scenario_id : int, token : str | None = Depends(auth.verify_token)
     ) -> dict[str, 'float']:
-    result = indicators_service.predict_indicators(scenario_id, token)
-    return result
\ No newline at end of file
+    result = await indicators_service.predict_indicators(scenario_id, token)
+    return result
+
+@router.post('/predict_batch', response_class=StreamingResponse, responses={200: {'content': {'application/x-ndjson': {}}}})
+async def predict_batch(
+        scenarios_ids : list[int], token : str | None = Depends(auth.verify_token)
+    ):
+    """Streams one JSON line per scenario with its indicators (or error detail) as soon as it is computed."""
+
+    async def stream():
+        async for item in indicators_service.predict_indicators_batch(scenarios_ids, token):
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
@@ -1,10 +1,12 @@
 import json
+import asyncio
 import pandas as pd
 import geopandas as gpd
 import shapely
+from fastapi import HTTPException
 from loguru import logger
 from .indicators import get_indicators
-from ...utils import api_client, const
+from ...utils import api_client, const, tracing
 
 def _get_best_source(df : pd.DataFrame):
     sources = df['source'].unique()
@@ -16,29 +18,76 @@ def _get_best_source(df : pd.DataFrame):
     df = df[df['source'] == source].sort_values('year', ascending=False)
     return df.iloc[0]
 
-def _get_functional_zones(scenario_id : int, token : str | None) -> gpd.GeoDataFrame:
-    logger.info('Getting functional zones')
-    sources = api_client.get_functional_zones_sources(scenario_id, token)
-    source = _get_best_source(sources)
-    gdf = api_client.get_functional_zones(scenario_id, token=token, **source)
+@tracing.trace
+def _preprocess_functional_zones(gdf : gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     for key in ['id', 'name']:
         gdf[f'functional_zone_type_{key}'] = gdf['functional_zone_type'].apply(lambda fzt : fzt[key])
     crs = gdf.estimate_utm_crs()
     return gdf.to_crs(crs)
 
-def _get_scenario_geometry(scenario_id : int, token):
-    project_id = api_client.get_scenario_by_id(scenario_id, token)['project']['project_id']
-    project_info = api_client.get_project_by_id(project_id, token)
+@tracing.trace
+async def _get_functional_zones(scenario_id : int, token : str | None) -> gpd.GeoDataFrame:
+    logger.info('Getting functional zones')
+    sources = await api_client.get_functional_zones_sources_async(scenario_id, token)
+    source = _get_best_source(sources)
+    gdf = await api_client.get_functional_zones_async(scenario_id, token=token, **source)
+    return await asyncio.to_thread(_preprocess_functional_zones, gdf)
+
+@tracing.trace
+async def _get_project_geometry(project_id : int, token):
+    project_info = await api_client.get_project_by_id_async(project_id, token)
     geometry_json = json.dumps(project_info['geometry'])
     return shapely.from_geojson(geometry_json)
 
-def predict_indicators(scenario_id : int, token : str | None):
-    functional_zones = _get_functional_zones(scenario_id, token)
-    scenario_geom = _get_scenario_geometry(scenario_id, token)
+@tracing.trace
+async def _get_scenario_geometry(scenario_id : int, token, projects_tasks : dict[int, asyncio.Task] | None = None):
+    logger.info('Getting scenario geometry')
+    scenario_info = await api_client.get_scenario_by_id_async(scenario_id, token)
+    project_id = scenario_info['project']['project_id']
+    if projects_tasks is None:
+        return await _get_project_geometry(project_id, token)
+    # scenarios of the same project share one in-flight fetch of its geometry
+    if project_id not in projects_tasks:
+        projects_tasks[project_id] = asyncio.ensure_future(_get_project_geometry(project_id, token))
+    return await asyncio.shield(projects_tasks[project_id])
 
+@tracing.trace
+def _predict_indicators(functional_zones : gpd.GeoDataFrame, scenario_geom : shapely.Geometry):
     scenario_gdf = gpd.GeoDataFrame(geometry=[scenario_geom], crs=const.DEFAULT_CRS).to_crs(functional_zones.crs)
     scenario_area = scenario_gdf.area.sum()
 
     indicators = get_indicators(functional_zones, 'functional_zone_type_name', None, scenario_area)
 
-    return {**indicators}
\ No newline at end of file
+    return {**indicators}
+
+@tracing.trace
+async def predict_indicators(scenario_id : int, token : str | None, projects_tasks : dict[int, asyncio.Task] | None = None):
+    # functional zones and scenario geometry chains don't depend on each other, so they are fetched concurrently
+    functional_zones, scenario_geom = await asyncio.gather(
+        _get_functional_zones(scenario_id, token),
+        _get_scenario_geometry(scenario_id, token, projects_tasks),
+    )
+    return await asyncio.to_thread(_predict_indicators, functional_zones, scenario_geom)
+
+async def _predict_batch_item(scenario_id : int, token : str | None, projects_tasks : dict[int, asyncio.Task], semaphore : asyncio.Semaphore) -> dict:
+    async with semaphore:
+        try:
+            indicators = await predict_indicators(scenario_id, token, projects_tasks)
+        except HTTPException as e:
+            return {'scenario_id': scenario_id, 'status_code': e.status_code, 'detail': e.detail}
+        except Exception as e:
+            logger.exception(e)
+            return {'scenario_id': scenario_id, 'status_code': 500, 'detail': str(e)}
+        return {'scenario_id': scenario_id, 'status_code': 200, 'indicators': indicators}
+
+async def predict_indicators_batch(scenarios_ids : list[int], token : str | None, max_concurrency : int = const.INDICATORS_BATCH_MAX_CONCURRENCY):
+    # items are yielded in order of completion, failed scenarios are yielded with their error instead of indicators
+    projects_tasks = {}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [asyncio.ensure_future(_predict_batch_item(scenario_id, token, projects_tasks, semaphore)) for scenario_id in dict.fromkeys(scenarios_ids)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in [*tasks, *projects_tasks.values()]:
+            task.cancel()
@@ -1,35 +1,59 @@
-import json
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+import pandas as pd
 import geopandas as gpd
 from lu_igi.optimization.problem import FitnessType
-from ...utils import const, auth
+from ...utils import const, auth, jobs, events, serialization, ingest
 from . import land_use_models, land_use_service
 
-router = APIRouter(prefix='/land_use', tags=['Land use'])
-
-def process_result(result : list[dict]):
-    
-    def process_item(item : dict):
-        gdf = item['gdf'].to_crs(const.DEFAULT_CRS)
-        gdf['land_use'] = gdf['land_use'].apply(lambda lu : None if lu is None else lu.value)
-        gdf['assigned_land_use'] = gdf['assigned_land_use'].apply(lambda lu : lu.value)
-        return {
-            'blocks': json.loads(gdf.to_json()),
-            'fitness': {ft.value : item[ft.value] for ft in list(FitnessType)}
-        }
-    
-    return [process_item(item) for item in result]
-
-@router.post('/generate')
-def generate_land_use(
-        project_id : int,
-        profile_id : int,
-        zones : land_use_models.ZonesFeatureCollection, 
-        roads :  land_use_models.RoadsFeatureCollection | None = None,
-        blocks : land_use_models.BlocksFeatureCollection | None = None,
-        max_iter : int = 1_000,
-        token : str = Depends(auth.verify_token),
-    ) -> list[land_use_models.LandUseResponseItem]:
+router = APIRouter(prefix='/land_use', tags=['Land use'], route_class=ingest.FastIngestRoute)
+
+LAYERS = ['zones', 'roads', 'blocks']
+# documents GeoParquet or Arrow IPC layers files accepted instead of the JSON body
+LAYERS_OPENAPI = {'requestBody': {'content': {'multipart/form-data': {'schema': {
+    'type': 'object',
+    'properties': {name : {'type': 'string', 'format': 'binary'} for name in LAYERS},
+    'required': ['zones']
+}}}}}
+
+def _process_result_gdf(item : dict) -> gpd.GeoDataFrame:
+    # only the properties of LandUseProperties are returned, the blocks have other preprocessing columns
+    gdf = item['gdf'][['land_use', 'assigned_land_use', 'geometry']].to_crs(const.DEFAULT_CRS)
+    gdf['land_use'] = gdf['land_use'].apply(lambda lu : None if lu is None else lu.value)
+    gdf['assigned_land_use'] = gdf['assigned_land_use'].apply(lambda lu : lu.value)
+    return gdf
+
+def process_result_item(item : dict) -> bytes:
+    # serialized once to JSON bytes, the blocks are too many to be validated by the response model
+    gdf = _process_result_gdf(item)
+    fitness = {ft.value : item[ft.value] for ft in list(FitnessType)}
+    return b'{"blocks":' + serialization.gdf_to_geojson(gdf) + b',"fitness":' + serialization.dumps(fitness) + b'}'
+
+def process_result(result : list[dict]) -> bytes:
+    return b'[' + b','.join(process_result_item(item) for item in result) + b']'
+
+def process_result_binary(result : list[dict], media_type : str) -> bytes:
+    # results are stacked into one table, rows of each result have its number and fitness values
+    gdfs = []
+    for i, item in enumerate(result):
+        gdf = _process_result_gdf(item)
+        gdf['result'] = i
+        for ft in list(FitnessType):
+            gdf[ft.value] = item[ft.value]
+        gdfs.append(gdf)
+    if len(gdfs) == 0:
+        return serialization.gdf_to_binary(gpd.GeoDataFrame(geometry=[], crs=const.DEFAULT_CRS), media_type)
+    return serialization.gdf_to_binary(gpd.GeoDataFrame(pd.concat(gdfs, ignore_index=True)), media_type)
+
+def _check_zones(zones_gdf : gpd.GeoDataFrame):
+    # an empty collection has no functional_zone_type column, which is needed to preprocess the zones
+    if 'functional_zone_type' not in zones_gdf.columns:
+        raise RequestValidationError([{'type': 'value_error', 'loc': ('body', 'zones', 'features'), 'msg': 'Input should have features with functional_zone_type', 'input': []}])
+
+def _parse_input(zones : land_use_models.ZonesFeatureCollection, roads : land_use_models.RoadsFeatureCollection | None, blocks : land_use_models.BlocksFeatureCollection | None):
     if blocks is not None:
         user_gdf = gpd.GeoDataFrame.from_features([f.model_dump() for f in blocks.features], const.DEFAULT_CRS)
         generate_blocks = False
@@ -39,5 +63,146 @@ def generate_land_use(
     else:
         raise HTTPException(400, 'Either blocks or roads must be provided in body')
     zones_gdf = gpd.GeoDataFrame.from_features([f.model_dump() for f in zones.features], const.DEFAULT_CRS)
-    result = land_use_service.generate_land_use(project_id, profile_id, user_gdf, zones_gdf, generate_blocks, max_iter, token)
-    return process_result(result)
\ No newline at end of file
+    _check_zones(zones_gdf)
+    return user_gdf, zones_gdf, generate_blocks
+
+def _parse_binary_input(layers : dict[str, bytes]):
+    if 'zones' not in layers:
+        raise HTTPException(400, 'zones must be provided in body')
+    zones_gdf = serialization.gdf_from_binary(layers['zones'])
+    if 'functional_zone_type' not in zones_gdf.columns:
+        raise HTTPException(400, 'zones must have functional_zone_type column')
+    if 'blocks' in layers:
+        user_gdf = serialization.gdf_from_binary(layers['blocks'])
+        generate_blocks = False
+    elif 'roads' in layers:
+        user_gdf = serialization.gdf_from_binary(layers['roads'])
+        generate_blocks = True
+    else:
+        raise HTTPException(400, 'Either blocks or roads must be provided in body')
+    return user_gdf, zones_gdf, generate_blocks
+
+def _parse_json_input(content : bytes):
+    body = ingest.loads(content)
+    if not isinstance(body, dict) or body.get('zones') is None:
+        raise HTTPException(400, 'zones must be provided in body')
+    # zones topology is fixed by buffer(0) while processing land use, so they are not checked to be valid
+    zones_gdf = ingest.read_feature_collection(body['zones'], ('zones',), ingest.POLYGON_TYPES, check_validity=False)
+    functional_zone_types = zones_gdf['functional_zone_type'] if 'functional_zone_type' in zones_gdf.columns else [None] * len(zones_gdf)
+    errors = [
+        {'type': 'value_error', 'loc': ('body', 'zones', 'features', i, 'properties', 'functional_zone_type'), 'msg': 'Input should have integer id', 'input': fzt}
+        for i, fzt in enumerate(functional_zone_types) if not isinstance(fzt, dict) or not isinstance(fzt.get('id'), int)
+    ]
+    if len(errors) > 0:
+        raise RequestValidationError(errors)
+    _check_zones(zones_gdf)
+    if body.get('blocks') is not None:
+        user_gdf = ingest.read_feature_collection(body['blocks'], ('blocks',), ingest.POLYGON_TYPES)
+        generate_blocks = False
+    elif body.get('roads') is not None:
+        user_gdf = ingest.read_feature_collection(body['roads'], ('roads',), ingest.LINE_TYPES)
+        generate_blocks = True
+    else:
+        raise HTTPException(400, 'Either blocks or roads must be provided in body')
+    return user_gdf, zones_gdf, generate_blocks
+
+async def _get_input(
+        request : Request,
+        zones : land_use_models.ZonesFeatureCollection | None = None,
+        roads :  land_use_models.RoadsFeatureCollection | None = None,
+        blocks : land_use_models.BlocksFeatureCollection | None = None,
+    ) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, bool]:
+    # layers are either GeoJSON in JSON body or GeoParquet / Arrow IPC files of multipart/form-data body,
+    # FastAPI leaves JSON body parameters empty for the latter and for JSON body in fast ingest mode
+    json_body = getattr(request.state, 'json_body', None)
+    if json_body:
+        return await run_in_threadpool(_parse_json_input, json_body)
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        layers = {name : await form[name].read() for name in LAYERS if isinstance(form.get(name), UploadFile)}
+        return await run_in_threadpool(_parse_binary_input, layers)
+    if zones is None:
+        raise HTTPException(400, 'zones must be provided in body')
+    return await run_in_threadpool(_parse_input, zones, roads, blocks)
+
+def _generate_land_use_job(*args, report_progress):
+    # executed in a jobs worker process
+    result = land_use_service.generate_land_use(*args, report_progress=report_progress)
+    return process_result(result)
+
+@router.post('/generate', responses=serialization.BINARY_RESPONSES, openapi_extra=LAYERS_OPENAPI)
+def generate_land_use(
+        project_id : int,
+        profile_id : int,
+        max_iter : int = 1_000,
+        warm_start : bool = False,
+        token : str = Depends(auth.verify_token),
+        land_use_input : tuple = Depends(_get_input),
+        accept : str | None = Header(None, description=serialization.ACCEPT_DESCRIPTION),
+    ) -> list[land_use_models.LandUseResponseItem]:
+    user_gdf, zones_gdf, generate_blocks = land_use_input
+    result = land_use_service.generate_land_use(project_id, profile_id, user_gdf, zones_gdf, generate_blocks, max_iter, token, warm_start)
+    media_type = serialization.negotiate_media_type(accept)
+    if media_type == serialization.GEOJSON:
+        return serialization.JSONBytesResponse(process_result(result))
+    return Response(process_result_binary(result, media_type), media_type=media_type)
+
+def _generate_land_use_stream(*args, report_progress):
+    # executed in a thread, results are serialized and sent one by one
+    result = land_use_service.generate_land_use(*args, report_progress=report_progress)
+    for item in result:
+        yield process_result_item(item)
+
+@router.post('/generate_stream', response_class=StreamingResponse, responses={200: {'content': {'text/event-stream': {}}}}, openapi_extra=LAYERS_OPENAPI)
+async def generate_land_use_stream(
+        project_id : int,
+        profile_id : int,
+        max_iter : int = 1_000,
+        warm_start : bool = False,
+        token : str = Depends(auth.verify_token),
+        land_use_input : tuple = Depends(_get_input),
+    ):
+    """
+    Streams land use generation as Server-Sent Events: `stage` for pipeline steps, `progress` with evaluations
+    count and best fitness after every optimizer generation, `result` for every Pareto front item and finally
+    `done` or `error`. Closing the connection stops the optimizer at the next generation.
+    """
+    land_use_service.check_warm_start(warm_start)
+    user_gdf, zones_gdf, generate_blocks = land_use_input
+    stream = events.stream_events(_generate_land_use_stream, project_id, profile_id, user_gdf, zones_gdf, generate_blocks, max_iter, token, warm_start)
+    return StreamingResponse(stream, media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@router.post('/jobs', status_code=202, openapi_extra=LAYERS_OPENAPI)
+def submit_land_use_job(
+        project_id : int,
+        profile_id : int,
+        max_iter : int = 1_000,
+        warm_start : bool = False,
+        token : str = Depends(auth.verify_token),
+        land_use_input : tuple = Depends(_get_input),
+    ) -> jobs.JobInfo:
+    """Submits land use generation as a background job, its progress and result are available by the returned job id."""
+    land_use_service.check_warm_start(warm_start)
+    user_gdf, zones_gdf, generate_blocks = land_use_input
+    jobs_manager = jobs.get_jobs_manager()
+    job_id = jobs_manager.submit(_generate_land_use_job, project_id, profile_id, user_gdf, zones_gdf, generate_blocks, max_iter, token, warm_start)
+    return jobs_manager.get_info(job_id)
+
+def _get_job_info(job_id : str) -> jobs.JobInfo:
+    job_info = jobs.get_jobs_manager().get_info(job_id)
+    if job_info is None:
+        raise HTTPException(404, f'Job {job_id} is not found')
+    return job_info
+
+@router.get('/jobs/{job_id}')
+def get_land_use_job(job_id : str) -> jobs.JobInfo:
+    return _get_job_info(job_id)
+
+@router.get('/jobs/{job_id}/result')
+def get_land_use_job_result(job_id : str) -> list[land_use_models.LandUseResponseItem]:
+    job_info = _get_job_info(job_id)
+    if job_info.status == jobs.JobStatus.FAILURE:
+        raise HTTPException(500, job_info.error)
+    if job_info.status != jobs.JobStatus.SUCCESS:
+        raise HTTPException(409, f'Job {job_id} is {job_info.status.value}')
+    return serialization.JSONBytesResponse(jobs.get_jobs_manager().get_result(job_id))
@@ -1,18 +1,26 @@
 import json
+import inspect
 import shapely
+import numpy as np
+from typing import Callable
 import geopandas as gpd
 import momepy
 from loguru import logger
-from ...utils import const, api_client
+from fastapi import HTTPException
+from ...utils import const, api_client, tracing
 from lu_igi.preprocessing.graph import generate_adjacency_graph
-from lu_igi.preprocessing.land_use import process_land_use
 from lu_igi.optimization.optimizer import Optimizer
+from lu_igi.optimization.problem import FitnessType
 from lu_igi.models.land_use import LandUse
 from blocksnet.preprocessing.blocks_generator import BlocksGenerator
 from .common import LU_MAPPING, LU_SHARES
+from .land_use_sessions import LandUseSession, sessions, get_session_key
 
 DEFAULT_CRS = 4326
+# progress, cancellation and warm start use hooks of the optimizer, which lu_igi versions may lack
+OPTIMIZER_RUN_PARAMETERS = set(inspect.signature(Optimizer.run).parameters)
 MIN_INTERSECTION_SHARE = 0.3
+BUFFER_RESOLUTION = 16 # the same as GeoSeries.buffer uses by default
 
 LAND_USE_MAPPING = {
     1 : LandUse.RESIDENTIAL,
@@ -32,16 +40,50 @@ def _get_profile_lu_shares(profile_id : int) -> dict[LandUse, float]:
     lu = LU_MAPPING[profile_id]
     return LU_SHARES[lu]
 
+def _get_land_use_shares(blocks_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame, land_use_mapping : dict[int, LandUse]) -> np.ndarray:
+    # shares of blocks areas covered by zones of every land use, in the order of LandUse
+    land_uses_codes = {lu : i for i, lu in enumerate(LandUse)}
+    zones_codes = np.array([land_uses_codes.get(land_use_mapping.get(zone), -1) for zone in zones_gdf['zone']], dtype=int)
+    zones = zones_gdf.geometry.values.to_numpy()[zones_codes >= 0]
+    zones_codes = zones_codes[zones_codes >= 0]
+
+    blocks = blocks_gdf.geometry.values.to_numpy()
+    blocks_areas = shapely.area(blocks)
+    blocks_idx, zones_idx = shapely.STRtree(zones).query(blocks, predicate='intersects')
+    # most blocks lie inside a single zone, their intersection is the block itself
+    shapely.prepare(zones)
+    inside = shapely.contains_properly(zones[zones_idx], blocks[blocks_idx])
+    areas = blocks_areas[blocks_idx]
+    areas[~inside] = shapely.area(shapely.intersection(blocks[blocks_idx[~inside]], zones[zones_idx[~inside]]))
+
+    shares = np.zeros((len(blocks), len(land_uses_codes)))
+    np.add.at(shares, (blocks_idx, zones_codes[zones_idx]), areas)
+    return np.divide(shares, blocks_areas[:, None], out=np.zeros_like(shares), where=blocks_areas[:, None] > 0)
+
+@tracing.trace
+def _intersect_land_use(blocks_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame, land_use_mapping : dict[int, LandUse], min_intersection_share : float = MIN_INTERSECTION_SHARE) -> gpd.GeoDataFrame:
+    # the same land use as process_land_use assigns, but only candidate pairs of blocks and zones from the spatial index are intersected
+    land_uses = list(LandUse)
+    shares = _get_land_use_shares(blocks_gdf, zones_gdf, land_use_mapping)
+    best_codes = shares.argmax(axis=1)
+    best_shares = shares[np.arange(len(blocks_gdf)), best_codes]
+    result_gdf = blocks_gdf.copy()
+    result_gdf['land_use'] = [land_uses[code] if share >= min_intersection_share else None for code, share in zip(best_codes, best_shares)]
+    return result_gdf
+
+@tracing.trace
 def _process_land_use(blocks_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame):
     logger.info('2. Processing blocks land use')
-    zones_gdf.geometry = zones_gdf.buffer(0) # somehow fixes topology problems
+    invalid = ~zones_gdf.is_valid
+    zones_gdf.loc[invalid, zones_gdf.geometry.name] = zones_gdf.loc[invalid].buffer(0) # somehow fixes topology problems
     logger.info('2.1. Mapping functional_zone_type with ids')
-    zones_gdf['zone'] = zones_gdf['functional_zone_type'].apply(lambda fzt : fzt['id'])
+    zones_gdf['zone'] = [fzt['id'] for fzt in zones_gdf['functional_zone_type']]
     logger.info('2.2. Intersecting land use with blocks')
-    result_gdf = process_land_use(blocks_gdf, zones_gdf, LAND_USE_MAPPING, min_intersection_share=0.3)
+    result_gdf = _intersect_land_use(blocks_gdf, zones_gdf, LAND_USE_MAPPING)
     logger.success('2.3. Land use is processed successfully')
     return result_gdf
 
+@tracing.trace
 def _get_project_geometry(project_id : int, token):
     project_info = api_client.get_project_by_id(project_id, token)
     geometry_json = json.dumps(project_info['geometry'])
@@ -50,6 +92,7 @@ def _get_project_geometry(project_id : int, token):
 def _fetch_water_objects(project_id : int, token : str):
     return None
 
+@tracing.trace
 def _generate_blocks(project_id : int, roads_gdf : gpd.GeoDataFrame, token : str | None):
 
     local_crs = roads_gdf.crs
@@ -68,35 +111,126 @@ def _generate_blocks(project_id : int, roads_gdf : gpd.GeoDataFrame, token : str
     roads_gdf = roads_gdf.explode(index_parts=False).reset_index(drop=True)
     roads_gdf.geometry = momepy.close_gaps(roads_gdf, 1)
     bg = BlocksGenerator(project_gdf, roads_gdf, None, water_gdf)
-    blocks_gdf = bg.run()
+    with tracing.span('land_use', 'blocks_generator', (roads_gdf,)):
+        blocks_gdf = bg.run()
     
     logger.success('1.4. Blocks are generated successfully')
     return blocks_gdf
 
+def _get_blocks_pairs(geometries : np.ndarray, max_distance : float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    tree = shapely.STRtree(geometries)
+    left, right = tree.query(geometries, predicate='dwithin', distance=max_distance)
+    mask = left < right
+    left, right = left[mask], right[mask]
+    return left, right, shapely.distance(geometries[left], geometries[right])
+
+def _find_root(parents : np.ndarray, i : int) -> int:
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def _find_roots(parents : np.ndarray, idx : np.ndarray) -> np.ndarray:
+    roots = parents[idx]
+    while True:
+        next_roots = parents[roots]
+        if (next_roots == roots).all():
+            return roots
+        roots = next_roots
+
+@tracing.trace
 def _get_buffer_size(blocks_gdf : gpd.GeoDataFrame, buffer_step = 5, max_buffer_size = 100):
+    # the smallest buffer size which merges all blocks into one polygon, found by joining blocks pairs into components
+    # instead of buffering and uniting all blocks for every size
+    geometries = blocks_gdf.geometry.values.to_numpy()
+    if len(geometries) == 0:
+        return max_buffer_size
+    left, right, distances = _get_blocks_pairs(geometries, 2 * max_buffer_size)
+    parents = np.arange(len(geometries))
+    n_components = len(geometries)
+    pending = np.ones(len(left), dtype=bool)
+
     buffer_size = 0
     while buffer_size < max_buffer_size:
-        union = blocks_gdf.geometry.buffer(buffer_size).unary_union
-        if isinstance(union, shapely.Polygon):
+        # buffers of blocks can't merge while the gap between them is wider than both buffers
+        candidates = np.flatnonzero(pending & (distances <= 2 * buffer_size))
+        same_component = _find_roots(parents, left[candidates]) == _find_roots(parents, right[candidates])
+        pending[candidates[same_component]] = False
+        candidates = candidates[~same_component]
+
+        # pairs are checked the same way all blocks were: their buffers union must be a single polygon
+        blocks_idx, inverse = np.unique(np.concatenate([left[candidates], right[candidates]]), return_inverse=True)
+        buffers = shapely.buffer(geometries[blocks_idx], buffer_size, quad_segs=BUFFER_RESOLUTION)
+        left_buffers, right_buffers = np.split(buffers[inverse], 2)
+        merged = shapely.get_type_id(shapely.union(left_buffers, right_buffers)) == shapely.GeometryType.POLYGON
+        for i in candidates[merged]:
+            left_root, right_root = _find_root(parents, left[i]), _find_root(parents, right[i])
+            if left_root != right_root:
+                parents[left_root] = right_root
+                n_components -= 1
+        pending[candidates[merged]] = False
+
+        if n_components == 1:
             break
         buffer_size += buffer_step
     return buffer_size
 
+def _get_optimizer_callback(session : LandUseSession, report_progress : Callable | None):
+    # called by the optimizer after every generation with the algorithm state,
+    # evaluations are added to the session since concurrent runs on it share the counter
+    last_n_eval = 0
+    def callback(algorithm):
+        nonlocal last_n_eval
+        n_eval = int(algorithm.evaluator.n_eval)
+        front_fitness = algorithm.opt.get('F')
+        with session.lock:
+            session.population = algorithm.pop.get('X')
+            session.front = algorithm.opt.get('X')
+            session.front_fitness = front_fitness
+            session.n_eval += n_eval - last_n_eval
+        last_n_eval = n_eval
+        if report_progress is not None:
+            best_fitness = front_fitness.min(axis=0)
+            report_progress(
+                n_eval=n_eval,
+                best_fitness={ft.value : float(f) for ft, f in zip(FitnessType, best_fitness)}
+            )
+    return callback
+
+def check_warm_start(warm_start : bool):
+    if warm_start and 'sampling' not in OPTIMIZER_RUN_PARAMETERS:
+        raise HTTPException(501, 'Warm start is not supported by the installed land use optimizer')
 
-def _optimize_land_use(profile_id : int, blocks_gdf : gpd.GeoDataFrame, max_iter : int):
+@tracing.trace
+def _run_optimizer(optimizer : Optimizer, session : LandUseSession, target_lu_shares : dict[LandUse, float], max_iter : int, warm_start : bool, report_progress : Callable | None):
+    kwargs = {}
+    if 'callback' in OPTIMIZER_RUN_PARAMETERS:
+        # the callback reports progress and stops the optimizer on cancellation
+        kwargs['callback'] = _get_optimizer_callback(session, report_progress)
+    else:
+        logger.warning('Optimizer of lu_igi has no callback parameter, the run is neither reported nor cancellable')
+    if warm_start:
+        with session.lock:
+            population = session.population
+        if population is None:
+            logger.warning('Warm start is requested, but no optimization was made on the input yet, running cold')
+        else:
+            kwargs['sampling'] = population
+    blocks_ids = list(session.blocks_gdf.index)
+    return optimizer.run(blocks_ids, target_lu_shares, n_eval=max_iter, verbose=False, **kwargs)
+
+@tracing.trace
+def _optimize_land_use(profile_id : int, session : LandUseSession, max_iter : int, warm_start : bool = False, report_progress : Callable | None = None):
     logger.info('3. Optimizing land use')
 
-    buffer_size = _get_buffer_size(blocks_gdf)
-    logger.info(f'3.1. Generating adjacency graph for buffer_size={buffer_size} and setting optimizer')
-    graph = generate_adjacency_graph(blocks_gdf, buffer_size)
-    optimizer = Optimizer(graph)
+    logger.info('3.1. Setting optimizer')
+    optimizer = Optimizer(session.graph)
 
     logger.info('3.2. Getting profile land use shares')
     target_lu_shares = _get_profile_lu_shares(profile_id)
-    blocks_ids = list(blocks_gdf.index)
 
     logger.info('3.3. Running the optimizer')
-    result_df = optimizer.run(blocks_ids, target_lu_shares, n_eval=max_iter, verbose=False)
+    result_df = _run_optimizer(optimizer, session, target_lu_shares, max_iter, warm_start, report_progress)
 
     logger.info('3.4. Expanding the result')
     result = optimizer.expand_result_df(result_df)
@@ -104,9 +238,8 @@ def _optimize_land_use(profile_id : int, blocks_gdf : gpd.GeoDataFrame, max_iter
     logger.success('3.5. Land use is optimized successfully')
     return result
 
-def generate_land_use(project_id : int, profile_id : int, user_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame, generate_blocks : bool, max_iter : int, token : str | None):
-
-    logger.info('0. Preprocessing input')
+@tracing.trace
+def _create_session(project_id : int, user_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame, generate_blocks : bool, token : str | None) -> LandUseSession:
     local_crs = zones_gdf.estimate_utm_crs()
     zones_gdf = zones_gdf.to_crs(local_crs)
     user_gdf = user_gdf.to_crs(local_crs)
@@ -118,4 +251,27 @@ def generate_land_use(project_id : int, profile_id : int, user_gdf : gpd.GeoData
 
     blocks_gdf = _process_land_use(blocks_gdf, zones_gdf)
 
-    return _optimize_land_use(profile_id, blocks_gdf, max_iter)
+    buffer_size = _get_buffer_size(blocks_gdf)
+    logger.info(f'2.4. Generating adjacency graph for buffer_size={buffer_size}')
+    with tracing.span('land_use', 'adjacency_graph', (blocks_gdf,)):
+        graph = generate_adjacency_graph(blocks_gdf, buffer_size)
+    return LandUseSession(blocks_gdf, graph)
+
+@tracing.trace
+def generate_land_use(project_id : int, profile_id : int, user_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame, generate_blocks : bool, max_iter : int, token : str | None, warm_start : bool = False, report_progress : Callable | None = None):
+    check_warm_start(warm_start)
+
+    logger.info('0. Preprocessing input')
+    # preprocessed blocks and graph are reused by requests with the same input, e.g. with another profile or max_iter
+    session_key = get_session_key(project_id, user_gdf, zones_gdf, generate_blocks, token)
+    session = sessions.get(session_key)
+    if session is None:
+        session = _create_session(project_id, user_gdf, zones_gdf, generate_blocks, token)
+        sessions.put(session_key, session)
+    else:
+        logger.info(f'0.1. Reusing preprocessed input after {session.n_eval} evaluations')
+
+    result = _optimize_land_use(profile_id, session, max_iter, warm_start, report_progress)
+    # the population size changes after the run
+    sessions.put(session_key, session)
+    return result
@@ -0,0 +1,115 @@
+import json
+import time
+import hashlib
+import threading
+import shapely
+import numpy as np
+import geopandas as gpd
+from collections import OrderedDict
+from ...utils import const
+
+# rough memory footprint of a graph node or edge with its attributes in bytes
+GRAPH_ELEMENT_SIZE = 500
+
+class LandUseSession:
+    """
+    Preprocessed land use optimization input and the state of the last optimization on it.
+
+    Attributes
+    ----------
+    blocks_gdf : gpd.GeoDataFrame
+        Blocks with processed land use.
+    graph
+        Adjacency graph of blocks.
+    population : np.ndarray | None
+        Decision variables of the last optimizer population, used to warm start the next run.
+    front : np.ndarray | None
+        Decision variables of the last Pareto front.
+    front_fitness : np.ndarray | None
+        Fitness values of the last Pareto front.
+    n_eval : int
+        Total number of evaluations made on the session.
+    lock : threading.Lock
+        Guards the optimization state, since concurrent runs may update it.
+    """
+
+    def __init__(self, blocks_gdf : gpd.GeoDataFrame, graph):
+        self.blocks_gdf = blocks_gdf
+        self.graph = graph
+        self.population : np.ndarray | None = None
+        self.front : np.ndarray | None = None
+        self.front_fitness : np.ndarray | None = None
+        self.n_eval = 0
+        self.lock = threading.Lock()
+        self.accessed_at = time.time()
+
+    @property
+    def size(self) -> int:
+        geometries_size = int(shapely.get_num_coordinates(self.blocks_gdf.geometry.values.to_numpy()).sum()) * 16
+        data_size = int(self.blocks_gdf.drop(columns='geometry').memory_usage(deep=True).sum())
+        graph_size = (self.graph.number_of_nodes() + self.graph.number_of_edges()) * GRAPH_ELEMENT_SIZE
+        with self.lock:
+            state_size = sum(0 if a is None else a.nbytes for a in (self.population, self.front, self.front_fitness))
+        return geometries_size + data_size + graph_size + state_size
+
+def get_session_key(project_id : int, user_gdf : gpd.GeoDataFrame, zones_gdf : gpd.GeoDataFrame, generate_blocks : bool, token : str | None) -> str:
+    # generated blocks are clipped to the project territory fetched with the token, so sessions are per user
+    token_hash = None if token is None else hashlib.sha256(token.encode()).hexdigest()
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([project_id, generate_blocks, token_hash]).encode())
+    for geometry in shapely.to_wkb(user_gdf.geometry.values.to_numpy()):
+        hasher.update(geometry)
+    for geometry in shapely.to_wkb(zones_gdf.geometry.values.to_numpy()):
+        hasher.update(geometry)
+    zones_ids = [fzt['id'] for fzt in zones_gdf['functional_zone_type']]
+    hasher.update(json.dumps(zones_ids).encode())
+    return hasher.hexdigest()
+
+class LandUseSessions:
+    """
+    LRU storage of land use sessions bounded by their estimated memory size and age.
+
+    Parameters
+    ----------
+    max_size : int
+        Memory budget in bytes, least recently used sessions are evicted above it.
+    ttl : float
+        Seconds since the last access after which a session is evicted.
+    """
+
+    def __init__(self, max_size : int = const.LAND_USE_SESSIONS_MAX_SIZE, ttl : float = const.LAND_USE_SESSIONS_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions : OrderedDict[str, LandUseSession] = OrderedDict()
+        # sizes are estimated once a session is put, since it is expensive for large blocks
+        self._sizes : dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        expired = [key for key, session in self._sessions.items() if time.time() - session.accessed_at > self.ttl]
+        for key in expired:
+            del self._sessions[key]
+            del self._sizes[key]
+        total_size = sum(self._sizes.values())
+        while total_size > self.max_size and len(self._sessions) > 0:
+            key, _ = self._sessions.popitem(last=False)
+            total_size -= self._sizes.pop(key)
+
+    def get(self, key : str) -> LandUseSession | None:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(key)
+            if session is not None:
+                session.accessed_at = time.time()
+                self._sessions.move_to_end(key)
+            return session
+
+    def put(self, key : str, session : LandUseSession):
+        size = session.size
+        with self._lock:
+            self._sessions[key] = session
+            self._sizes[key] = size
+            self._sessions.move_to_end(key)
+            self._evict()
+
+sessions = LandUseSessions()
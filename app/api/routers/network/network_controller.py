@@ -1,13 +1,20 @@
 import geopandas as gpd
-from fastapi import APIRouter, Depends
-from ...utils import decorators, auth
+from fastapi import APIRouter, Depends, Query
+from ...utils import decorators, auth, serialization
 from . import network_service, network_models
 
+MAX_VARIANTS = 10
+
 router = APIRouter(prefix='/network', tags=['Network'])
 
-@router.post('/generate')
+@router.post('/generate', responses=serialization.BINARY_RESPONSES)
 @decorators.gdf_to_geojson
-def generate_network(project_id : int, token : str = Depends(auth.verify_token)) -> network_models.RoadNetworkModel:
-    return network_service.generate_network(project_id, token)
+def generate_network(
+        project_id : int,
+        seed : int | None = Query(None, ge=0),
+        n_variants : int = Query(1, ge=1, le=MAX_VARIANTS),
+        token : str = Depends(auth.verify_token)
+    ) -> network_models.RoadNetworkModel:
+    return network_service.generate_network(project_id, token, seed, n_variants)
         
     
\ No newline at end of file
@@ -8,6 +8,7 @@ class RoadNetworkModel(pg.FeatureCollectionModel):
 
         class RoadNetworkProperties(BaseModel):
             status : Literal[1,2,3] = Field(default=2)
+            variant : int | None = Field(default=None)
 
         geometry : pg.LineStringModel | pg.MultiLineStringModel
         properties : RoadNetworkProperties
@@ -1,21 +1,26 @@
 import numpy as np
 import geopandas as gpd
 import shapely
-from shapely.geometry import Point, LineString, MultiLineString, MultiPoint, box, MultiPolygon
 from loguru import logger
 from shapely.ops import split
 import pandas as pd
-import random
 import math
 import json
-from ...utils import api_client, const
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ...utils import api_client, const, tracing
 
 AREA_PER_PART = 10_000_000
 MAIN_ANGLE_MIN = -45
 MAIN_ANGLE_MAX = 45
 SECONDARY_ANGLE_MIN = 85
 SECONDARY_ANGLE_MAX = 95
+MAX_STREETS_ATTEMPTS = 100
 
+@tracing.trace
 def _fetch_project_geometry(project_id : int, token : str):
     # scenario_info = api_client.get_scenario_by_id(project_scenario_id, token)
     # print(scenario_info)
@@ -29,6 +34,7 @@ def _calculate_num_parts(polygon : shapely.Polygon, area_per_part=AREA_PER_PART)
   num_parts = int(np.floor(area / area_per_part)) + 1
   return num_parts
 
+@tracing.trace
 def _polygon_to_parts(polygon : shapely.Polygon, num_parts : int, crs) -> gpd.GeoDataFrame:
 
   if num_parts == 1:
@@ -77,12 +83,29 @@ def _interpolate_points_on_line(line : shapely.LineString, t1 : float, t2 : floa
     point2 = line.interpolate(t2, normalized=True)
     return point1, point2
 
+def _get_split_candidates(geometries : np.ndarray) -> dict[int, np.ndarray]:
+    # STRtree returns only intersecting pairs, touching pairs are never split so they are dropped in bulk
+    tree = shapely.STRtree(geometries)
+    lines_idx, others_idx = tree.query(geometries, predicate='intersects')
+    mask = lines_idx != others_idx
+    lines_idx, others_idx = lines_idx[mask], others_idx[mask]
+    mask = ~shapely.touches(geometries[lines_idx], geometries[others_idx])
+    lines_idx, others_idx = lines_idx[mask], others_idx[mask]
+    order = np.lexsort((others_idx, lines_idx))
+    lines_idx, others_idx = lines_idx[order], others_idx[order]
+    unique_idx, starts = np.unique(lines_idx, return_index=True)
+    return dict(zip(unique_idx, np.split(others_idx, starts[1:])))
+
+@tracing.trace
 def _split_lines(lines_gdf: gpd.GeoDataFrame):
+    geometries = lines_gdf.geometry.values.to_numpy()
+    candidates = _get_split_candidates(geometries)
     new_lines = []
-    for i, line in enumerate(lines_gdf.geometry):
+    for i, line in enumerate(geometries):
         split_line = line
-        for j, other_line in enumerate(lines_gdf.geometry):
-            if split_line is not None and other_line is not None and i != j:
+        for j in candidates.get(i, []):
+            other_line = geometries[j]
+            if split_line is not None and other_line is not None:
                 # Проверка на пересечение (не просто касание)
                 if split_line.intersects(other_line) and not split_line.touches(other_line):
                     try:
@@ -104,24 +127,48 @@ def _split_lines(lines_gdf: gpd.GeoDataFrame):
     return new_lines
 
 
-def _generate_streets(gdf : gpd.GeoDataFrame):
+def _lines_intersect_within(point1 : shapely.Point, angle1 : float, point2 : shapely.Point, angle2 : float, geometry : shapely.Geometry, length : int = 100_000) -> bool:
+    # lines through the points are intersected in closed form, their clipped parts may intersect only at this point
+    d1 = np.array([np.cos(np.radians(angle1)), np.sin(np.radians(angle1))])
+    d2 = np.array([np.cos(np.radians(angle2)), np.sin(np.radians(angle2))])
+    det = d1[0] * d2[1] - d1[1] * d2[0]
+    if abs(det) < 1e-12:
+        return False
+    dp = np.array([point2.x - point1.x, point2.y - point1.y])
+    s = (dp[0] * d2[1] - dp[1] * d2[0]) / det
+    u = (dp[0] * d1[1] - dp[1] * d1[0]) / det
+    if abs(s) > length or abs(u) > length:
+        return False
+    return shapely.intersects_xy(geometry, point1.x + s * d1[0], point1.y + s * d1[1])
+
+@tracing.trace
+def _generate_streets(gdf : gpd.GeoDataFrame, rng : np.random.Generator, max_attempts : int = MAX_STREETS_ATTEMPTS) -> tuple[gpd.GeoDataFrame, int]:
 
   geometry = gdf.iloc[0].geometry
   center = geometry.centroid
+  shapely.prepare(geometry)
 
-  main_angle = random.uniform(MAIN_ANGLE_MIN, MAIN_ANGLE_MAX)
+  main_angle = rng.uniform(MAIN_ANGLE_MIN, MAIN_ANGLE_MAX)
   main_line = _create_line_through_point(center, angle=main_angle)
   main_line = main_line.intersection(geometry)
 
-  t1 = random.uniform(0.2, 0.4)
-  t2 = random.uniform(0.5, 0.8)
+  t1 = rng.uniform(0.2, 0.4)
+  t2 = rng.uniform(0.5, 0.8)
 
   point1, point2 = _interpolate_points_on_line(main_line, t1, t2)
 
-  while True:
-    
-      secondary_angle_1 = main_angle + random.uniform(SECONDARY_ANGLE_MIN, SECONDARY_ANGLE_MAX)
-      secondary_angle_2 = main_angle + random.uniform(SECONDARY_ANGLE_MIN, SECONDARY_ANGLE_MAX)
+  # secondary angles are redrawn until the secondary lines don't intersect within the part,
+  # perpendicular lines are parallel and never intersect, so they are used if the attempts are over
+  for attempt in range(1, max_attempts + 2):
+
+      if attempt > max_attempts:
+          logger.warning(f'Secondary streets still intersect after {max_attempts} attempts, using perpendicular ones')
+          secondary_angle_1 = secondary_angle_2 = main_angle + 90
+      else:
+          secondary_angle_1 = main_angle + rng.uniform(SECONDARY_ANGLE_MIN, SECONDARY_ANGLE_MAX)
+          secondary_angle_2 = main_angle + rng.uniform(SECONDARY_ANGLE_MIN, SECONDARY_ANGLE_MAX)
+          if _lines_intersect_within(point1, secondary_angle_1, point2, secondary_angle_2, geometry):
+              continue
 
       secondary_line_1 = _create_line_through_point(point1, angle=secondary_angle_1)
       secondary_line_2 = _create_line_through_point(point2, angle=secondary_angle_2)
@@ -129,14 +176,15 @@ def _generate_streets(gdf : gpd.GeoDataFrame):
       secondary_line_1 = secondary_line_1.intersection(geometry)
       secondary_line_2 = secondary_line_2.intersection(geometry)
 
-      if not secondary_line_1.intersects(secondary_line_2):
+      if attempt > max_attempts or not secondary_line_1.intersects(secondary_line_2):
           break
 
   lines_gdf = gpd.GeoDataFrame(geometry=[main_line, secondary_line_1, secondary_line_2], crs=gdf.crs)
   splitted_lines_gdf = _split_lines(lines_gdf)
 
-  return splitted_lines_gdf
+  return splitted_lines_gdf, attempt
 
+@tracing.trace
 def _get_blocks(gdf : gpd.GeoDataFrame, lines_gdf : gpd.GeoDataFrame, buffer : int = 2) -> gpd.GeoDataFrame:
     buffered_lines = lines_gdf.buffer(buffer)
     merged_polygon = buffered_lines.unary_union
@@ -147,44 +195,32 @@ def _get_blocks(gdf : gpd.GeoDataFrame, lines_gdf : gpd.GeoDataFrame, buffer : i
     split_territory = split_territory.explode(index_parts=False)
     return split_territory
 
+@tracing.trace
 def _create_ring_roads(gdf : gpd.GeoDataFrame, blocks_gdf : gpd.GeoDataFrame, buffer_distance : int = 3):
 
-    points = gdf.centroid
-    points_gdf = gpd.GeoDataFrame(geometry=points, crs=gdf.crs)
-
-    buffered_blocks = blocks_gdf.copy()
-    buffered_blocks['geometry'] = buffered_blocks['geometry'].buffer(distance=buffer_distance)
-
-    result_gdf = gpd.GeoDataFrame(columns=['block_id', 'point_id', 'geometry'], crs=gdf.crs)
-
-    for block_id, block in buffered_blocks.iterrows():
-        for point_id, point in points_gdf.iterrows():
-            if block['geometry'].contains(point['geometry']):
-                centroid = block['geometry'].centroid
-                line = shapely.MultiPoint([point['geometry'], centroid]).convex_hull
-                result_gdf = pd.concat([result_gdf, pd.DataFrame({
-                    'block_id': [block_id],
-                    'point_id': [point_id],
-                    'geometry': [line]
-                })], ignore_index=True)
-
-    result_gdf = result_gdf[['block_id', 'geometry']]
-
-    blocks_gdf['centroid'] = blocks_gdf.geometry.centroid
-
-    new_lines = []
-    for _, polygon in blocks_gdf.iterrows():
-        centroid = polygon['centroid']
-        intersecting_lines = result_gdf[result_gdf.intersects(polygon.geometry)]
-
-        for line_idx, line in intersecting_lines.iterrows():
-            if not line.geometry.is_empty:
-                coords = list(line.geometry.coords)
-                coords[-1] = (centroid.x, centroid.y)
-                new_line = shapely.LineString(coords)
-                new_lines.append(new_line)
-
-    final_result_gdf = gpd.GeoDataFrame(new_lines, columns=['geometry'], crs=gdf.crs)
+    points = gdf.centroid.values.to_numpy()
+    blocks = blocks_gdf.geometry.values.to_numpy()
+    buffered_blocks = shapely.buffer(blocks, buffer_distance)
+
+    # every line centroid is connected with the centroid of each buffered block containing it
+    points_tree = shapely.STRtree(points)
+    blocks_idx, points_idx = points_tree.query(buffered_blocks, predicate='contains')
+    order = np.lexsort((points_idx, blocks_idx))
+    blocks_idx, points_idx = blocks_idx[order], points_idx[order]
+    starts = shapely.get_coordinates(points[points_idx])
+    ends = shapely.get_coordinates(shapely.centroid(buffered_blocks[blocks_idx]))
+    lines = shapely.linestrings(np.stack([starts, ends], axis=1).reshape(-1, 2), indices=np.repeat(np.arange(len(starts)), 2))
+
+    # then the end of every line is moved to the centroid of each block it intersects
+    lines_tree = shapely.STRtree(lines)
+    polygons_idx, lines_idx = lines_tree.query(blocks, predicate='intersects')
+    order = np.lexsort((lines_idx, polygons_idx))
+    polygons_idx, lines_idx = polygons_idx[order], lines_idx[order]
+    starts = starts[lines_idx]
+    ends = shapely.get_coordinates(shapely.centroid(blocks[polygons_idx]))
+    new_lines = shapely.linestrings(np.stack([starts, ends], axis=1).reshape(-1, 2), indices=np.repeat(np.arange(len(starts)), 2))
+
+    final_result_gdf = gpd.GeoDataFrame(geometry=new_lines, crs=gdf.crs)
 
     return final_result_gdf
 
@@ -230,51 +266,60 @@ def _extend_line(line : shapely.LineString, distance : float = 0.25) -> shapely.
     else:
         return line
 
-def _snap_endpoints(gdf : gpd.GeoDataFrame, tolerance : float = 0.2) -> gpd.GeoDataFrame:
-    endpoints = []
-    for line in gdf.geometry:
-      point_a = shapely.Point(line.coords[0])
-      point_b = shapely.Point(line.coords[0])
-      endpoints.extend([point_a, point_b])
-
-    endpoints_gs = gpd.GeoSeries(endpoints)
-
-    merged_points = []
-    used = set()
-
-    for i, point1 in enumerate(endpoints_gs):
-        if i in used:
+def _cluster_points(points : np.ndarray, tolerance : float) -> np.ndarray:
+    # greedy clustering in input order: every not yet clustered point becomes a seed and takes all free points within tolerance
+    tree = shapely.STRtree(points)
+    points_idx, neighbors_idx = tree.query(points, predicate='dwithin', distance=tolerance)
+    order = np.lexsort((neighbors_idx, points_idx))
+    points_idx, neighbors_idx = points_idx[order], neighbors_idx[order]
+    starts = np.searchsorted(points_idx, np.arange(len(points) + 1))
+
+    labels = np.full(len(points), -1)
+    degrees = np.diff(starts)
+    isolated = degrees <= 1
+    labels[isolated] = np.flatnonzero(isolated)
+    for i in np.flatnonzero(~isolated):
+        if labels[i] >= 0:
             continue
-
-        close_points = [point1]
-        for j, point2 in enumerate(endpoints_gs):
-            if i != j and j not in used and point1.distance(point2) <= tolerance:
-                close_points.append(point2)
-                used.add(j)
-
-        centroid = shapely.unary_union(close_points).centroid
-        merged_points.append(centroid)
-
-    new_geometries = []
-
-    for line in gdf.geometry:
-        coords = list(line.coords)
-        new_coords = []
-
-        for coord in coords:
-            point = shapely.Point(coord)
-            for merged_point in merged_points:
-                if point.distance(merged_point) <= tolerance:
-                    point = merged_point
-                    break
-            new_coords.append((point.x, point.y))
-
-        new_line = shapely.LineString(new_coords)
-        new_geometries.append(new_line)
-
-    gdf['geometry'] = new_geometries
+        neighbors = neighbors_idx[starts[i]:starts[i + 1]]
+        labels[neighbors[labels[neighbors] < 0]] = i
+    return labels
+
+def _get_clusters_centroids(coords : np.ndarray, labels : np.ndarray) -> np.ndarray:
+    # centroid of distinct points of every cluster, clusters are ordered by their seed
+    unique_rows = np.unique(np.column_stack([labels, coords]), axis=0)
+    clusters, inverse = np.unique(unique_rows[:, 0], return_inverse=True)
+    counts = np.bincount(inverse)
+    xs = np.bincount(inverse, weights=unique_rows[:, 1]) / counts
+    ys = np.bincount(inverse, weights=unique_rows[:, 2]) / counts
+    return np.column_stack([xs, ys])
+
+@tracing.trace
+def _snap_endpoints(gdf : gpd.GeoDataFrame, tolerance : float = 0.2) -> gpd.GeoDataFrame:
+    if len(gdf) == 0:
+        return gdf
+
+    geometries = gdf.geometry.values.to_numpy()
+    starts = shapely.get_coordinates(shapely.get_point(geometries, 0))
+    ends = shapely.get_coordinates(shapely.get_point(geometries, -1))
+    endpoints_coords = np.stack([starts, ends], axis=1).reshape(-1, 2)
+
+    labels = _cluster_points(shapely.points(endpoints_coords), tolerance)
+    merged_coords = _get_clusters_centroids(endpoints_coords, labels)
+
+    # every coordinate is moved to the first merged point within tolerance
+    coords = shapely.get_coordinates(geometries)
+    tree = shapely.STRtree(shapely.points(merged_coords))
+    coords_idx, merged_idx = tree.query(shapely.points(coords), predicate='dwithin', distance=tolerance)
+    snapped_idx = np.full(len(coords), len(merged_coords))
+    np.minimum.at(snapped_idx, coords_idx, merged_idx)
+    snapped = snapped_idx < len(merged_coords)
+    coords[snapped] = merged_coords[snapped_idx[snapped]]
+
+    gdf['geometry'] = shapely.set_coordinates(geometries.copy(), coords)
     return gdf
 
+@tracing.trace
 def _longify_roads(gdf_a : gpd.GeoDataFrame, gdf_b : gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     combined_gdf = pd.concat([gdf_a, gdf_b], ignore_index=True)
     combined_gdf['geometry'] = combined_gdf['geometry'].apply(lambda geom: _extend_line(geom, distance=0.25))
@@ -283,103 +328,97 @@ def _longify_roads(gdf_a : gpd.GeoDataFrame, gdf_b : gpd.GeoDataFrame) -> gpd.Ge
     combined_gdf = combined_gdf[combined_gdf['length'] >= 1.5]
     return _snap_endpoints(combined_gdf)
 
-def _calculate_angle(line1 : shapely.LineString, line2 : shapely.LineString) -> float:
-    def direction_vector(line):
-        x_diff = line.coords[-1][0] - line.coords[0][0]
-        y_diff = line.coords[-1][1] - line.coords[0][1]
-        return np.array([x_diff, y_diff])
-
-    v1 = direction_vector(line1)
-    v2 = direction_vector(line2)
-
-    angle_rad = math.atan2(np.linalg.det([v1, v2]), np.dot(v1, v2))
-    angle_deg = abs(math.degrees(angle_rad))
-    return min(angle_deg, 360 - angle_deg)
+def _calculate_angles(directions : np.ndarray) -> np.ndarray:
+    # pairwise angles in degrees between direction vectors, from 0 to 180
+    cross = directions[:, None, 0] * directions[None, :, 1] - directions[:, None, 1] * directions[None, :, 0]
+    dot = directions @ directions.T
+    return np.abs(np.degrees(np.arctan2(cross, dot)))
+
+def _sort_by_length_descending(lengths : np.ndarray) -> np.ndarray:
+    # the same order as pandas sort_values(ascending=False) gives, ties included
+    reversed_idx = np.arange(len(lengths))[::-1]
+    return reversed_idx[lengths[::-1].argsort(kind='quicksort')][::-1]
+
+def _get_best_pair(directions : np.ndarray, lengths : np.ndarray) -> tuple[int, int] | None:
+    # pair of lines with the largest angle between them, the longest lines are preferred among equal angles
+    order = _sort_by_length_descending(lengths)
+    angles = _calculate_angles(directions[order])
+    i, j = np.triu_indices(len(order), k=1)
+    pairs_angles = angles[i, j]
+    best = np.argmax(pairs_angles)
+    if pairs_angles[best] <= 0:
+        return None
+    return order[i[best]], order[j[best]]
 
+@tracing.trace
 def _process_geodata(gdf : gpd.GeoDataFrame, result_gdf : gpd.GeoDataFrame, split_territory : gpd.GeoDataFrame, buffer_distance : float = 1):
 
     boundary = gdf.boundary
     buffered_boundary = boundary.buffer(buffer_distance)
 
-    intersecting_polygons = split_territory[split_territory.intersects(buffered_boundary.unary_union)]
-    lines_within_polygons = result_gdf[result_gdf.intersects(intersecting_polygons.unary_union)]
-
-    indices_to_remove = lines_within_polygons.index
-    result_gdf = result_gdf.drop(indices_to_remove)
+    intersecting_polygons = split_territory[split_territory.intersects(buffered_boundary.union_all())]
 
-    projected_polygons = intersecting_polygons.to_crs(gdf.crs)
-    projected_lines = lines_within_polygons.to_crs(gdf.crs)
+    # lines intersecting every boundary polygon, grouped by polygon in their order
+    lines = result_gdf.geometry.values.to_numpy()
+    polygons = intersecting_polygons.geometry.values.to_numpy()
+    tree = shapely.STRtree(lines)
+    polygons_idx, lines_idx = tree.query(polygons, predicate='intersects')
+    order = np.lexsort((lines_idx, polygons_idx))
+    polygons_idx, lines_idx = polygons_idx[order], lines_idx[order]
+    _, starts = np.unique(polygons_idx, return_index=True)
 
-    result_lines = gpd.GeoDataFrame(columns=projected_lines.columns, crs=projected_lines.crs)
+    directions = shapely.get_coordinates(shapely.get_point(lines, -1)) - shapely.get_coordinates(shapely.get_point(lines, 0))
+    lengths = shapely.length(lines)
 
-    for _, polygon in projected_polygons.iterrows():
-        lines_within_polygon = projected_lines[projected_lines.intersects(polygon.geometry)]
-
-        if len(lines_within_polygon) < 2:
+    best_pairs_idx = []
+    for group_idx in np.split(lines_idx, starts[1:]):
+        if len(group_idx) < 2:
             continue
+        best_pair = _get_best_pair(directions[group_idx], lengths[group_idx])
+        if best_pair is not None:
+            best_pairs_idx.extend(group_idx[list(best_pair)])
 
-        lines_within_polygon = lines_within_polygon.copy()
-        lines_within_polygon['length'] = lines_within_polygon.length
-
-        sorted_lines = lines_within_polygon.sort_values(by='length', ascending=False)
-        max_min_angle = 0
-        best_pair = None
-
-        for i in range(len(sorted_lines) - 1):
-            for j in range(i + 1, len(sorted_lines)):
-                line1 = sorted_lines.iloc[i].geometry
-                line2 = sorted_lines.iloc[j].geometry
-
-                angle = _calculate_angle(line1, line2)
-
-                if angle > max_min_angle:
-                    max_min_angle = angle
-                    best_pair = (sorted_lines.iloc[i], sorted_lines.iloc[j])
-
-        if best_pair:
-            result_lines = pd.concat([result_lines, pd.DataFrame([best_pair[0], best_pair[1]]).drop(columns='length')], ignore_index=True)
-
-    result_lines = result_lines.drop(columns='length', errors='ignore').set_crs(gdf.crs)
+    result_lines = result_gdf.iloc[best_pairs_idx].reset_index(drop=True)
+    result_gdf = result_gdf.drop(result_gdf.index[np.unique(lines_idx)])
 
     return result_gdf, result_lines, intersecting_polygons
 
+def _get_intersection_points(lines : np.ndarray) -> np.ndarray:
+    # points where every pair of lines cross, in the order of pairs, overlapping lines give no points
+    tree = shapely.STRtree(lines)
+    lines_idx, others_idx = tree.query(lines, predicate='intersects')
+    mask = lines_idx < others_idx
+    lines_idx, others_idx = lines_idx[mask], others_idx[mask]
+    order = np.lexsort((others_idx, lines_idx))
+    intersections = shapely.intersection(lines[lines_idx[order]], lines[others_idx[order]])
+    types_ids = shapely.get_type_id(intersections)
+    intersections = intersections[(types_ids == shapely.GeometryType.POINT) | (types_ids == shapely.GeometryType.MULTIPOINT)]
+    return shapely.get_parts(intersections)
+
+@tracing.trace
 def _find_intersections_and_create_lines(combined_gdf, intersecting_polygons):
-    intersection_points = []
+    intersection_points = _get_intersection_points(combined_gdf.geometry.values.to_numpy())
+    centroids = intersecting_polygons.geometry.centroid.values.to_numpy()
 
-    for i in range(len(combined_gdf)):
-        for j in range(i + 1, len(combined_gdf)):
-            line1 = combined_gdf.geometry.iloc[i]
-            line2 = combined_gdf.geometry.iloc[j]
+    if len(intersection_points) == 0 or len(centroids) == 0:
+        return gpd.GeoDataFrame(geometry=[], crs=combined_gdf.crs)
 
-            if line1.intersects(line2):
-                intersection = line1.intersection(line2)
+    # every centroid is connected with the nearest intersection point, the first one among equally near
+    tree = shapely.STRtree(intersection_points)
+    centroids_idx, points_idx = tree.query_nearest(centroids, all_matches=True)
+    nearest_idx = np.full(len(centroids), len(intersection_points))
+    np.minimum.at(nearest_idx, centroids_idx, points_idx)
 
-                if isinstance(intersection, shapely.Point):
-                    intersection_points.append(intersection)
-                elif intersection.geom_type == 'MultiPoint':
-                    intersection_points.extend([point for point in intersection])
+    starts = shapely.get_coordinates(intersection_points[nearest_idx])
+    ends = shapely.get_coordinates(centroids)
+    lines = shapely.linestrings(np.stack([starts, ends], axis=1))
 
-    intersections_gdf = gpd.GeoDataFrame(geometry=intersection_points, crs=combined_gdf.crs)
-
-    intersecting_polygons_copy = intersecting_polygons.copy()
-    intersecting_polygons_copy['centroid'] = intersecting_polygons_copy.geometry.centroid
-
-    lines_to_centroids = []
-
-    for idx, polygon in intersecting_polygons_copy.iterrows():
-        centroid = polygon['centroid']
-
-        nearest_point = intersections_gdf.distance(centroid).idxmin()
-        nearest_point_geom = intersections_gdf.geometry.iloc[nearest_point]
-
-        line = shapely.LineString([nearest_point_geom, centroid])
-        lines_to_centroids.append(line)
-
-    lines_gdf = gpd.GeoDataFrame(geometry=lines_to_centroids, crs=intersections_gdf.crs)
+    lines_gdf = gpd.GeoDataFrame(geometry=lines, crs=combined_gdf.crs)
 
     return lines_gdf
 
-def _select_central_polygons(territory, split_territory):
+@tracing.trace
+def _select_central_polygons(territory, split_territory, rng : np.random.Generator):
     territory_centroid = territory.geometry.centroid.iloc[0]
 
     split_territory['distance'] = split_territory.geometry.apply(lambda g: shapely.distance(g, territory_centroid))
@@ -389,7 +428,7 @@ def _select_central_polygons(territory, split_territory):
     lower_bound = int(total_polygons * 0.01)
     upper_bound = int(total_polygons * 0.35)
 
-    num_to_select = np.random.randint(lower_bound, upper_bound + 1)
+    num_to_select = rng.integers(lower_bound, upper_bound + 1)
 
     central_polygons = split_sorted.head(num_to_select)
     central_gdf = gpd.GeoDataFrame(central_polygons, geometry='geometry')
@@ -420,6 +459,7 @@ def _find_intersecting_centroid(line, polygons):
         return intersecting.iloc[0].centroid
     return None
 
+@tracing.trace
 def _process_territory_graph(territory, combined_gdf, intersecting_polygons):
     territory_boundary = territory.boundary
     territory_boundary = convert_geodataframe(territory_boundary, territory.crs)
@@ -439,6 +479,7 @@ def _process_territory_graph(territory, combined_gdf, intersecting_polygons):
 
     return graph
 
+@tracing.trace
 def _process_territory(territory_big, final_result):
     territory_big_boundary = territory_big.boundary
     territory_big_boundary = convert_geodataframe(territory_big_boundary, territory_big.crs)
@@ -446,68 +487,162 @@ def _process_territory(territory_big, final_result):
 
     return final
 
+@tracing.trace
+def get_endpoints_degrees(gdf : gpd.GeoDataFrame, buffer_distance : float = 0.1) -> gpd.GeoDataFrame:
+    """
+    Counts other lines near both endpoints of every LineString of a road network.
+
+    Parameters
+    ----------
+    gdf : gpd.GeoDataFrame
+        Road network lines.
+    buffer_distance : float
+        Lines intersecting the buffer of an endpoint are connected to it.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        Endpoints with ``line`` position of their line in `gdf`, ``end`` (0 for the start, 1 for the end) and
+        ``degree`` as the number of other lines connected to the endpoint.
+    """
+    geometries = gdf.geometry.values.to_numpy()
+    lines_idx = np.flatnonzero(shapely.get_type_id(geometries) == shapely.GeometryType.LINESTRING)
+    lines = geometries[lines_idx]
+    endpoints = np.column_stack([shapely.get_point(lines, 0), shapely.get_point(lines, -1)]).ravel()
+    endpoints_lines_idx = np.repeat(lines_idx, 2)
+
+    tree = shapely.STRtree(geometries)
+    buffers = shapely.buffer(endpoints, buffer_distance, quad_segs=16)
+    endpoints_idx, others_idx = tree.query(buffers, predicate='intersects')
+    mask = others_idx != endpoints_lines_idx[endpoints_idx]
+    degrees = np.bincount(endpoints_idx[mask], minlength=len(endpoints))
+
+    return gpd.GeoDataFrame({
+        'line': endpoints_lines_idx,
+        'end': np.tile([0, 1], len(lines)),
+        'degree': degrees,
+    }, geometry=endpoints, crs=gdf.crs)
+
+@tracing.trace
 def _get_connected_and_unconnected_lines(gdf, buffer_distance=0.1):
-    connected_lines = []
-    unconnected_lines = []
-
-    for idx, line in gdf.iterrows():
-        geom = line.geometry
+    endpoints_gdf = get_endpoints_degrees(gdf, buffer_distance)
+    lines_idx = endpoints_gdf['line'].to_numpy()[::2]
+    degrees = endpoints_gdf['degree'].to_numpy().reshape(-1, 2)
+    start_intersects = degrees[:, 0] > 0
+    end_intersects = degrees[:, 1] > 0
+
+    connected_lines_gdf = gdf.iloc[lines_idx[start_intersects & end_intersects]]
+    unconnected_lines_gdf = gdf.iloc[lines_idx[start_intersects != end_intersects]].copy()
+    unconnected = _snap_endpoints(unconnected_lines_gdf, tolerance=100)
+    line_final = pd.concat([connected_lines_gdf, unconnected], ignore_index=True)
 
-        if isinstance(geom, LineString):
-            start_buffer = Point(geom.coords[0]).buffer(buffer_distance)
-            end_buffer = Point(geom.coords[-1]).buffer(buffer_distance)
+    return line_final.set_crs(gdf.crs)
 
-            start_intersects = not gdf[(gdf.geometry.intersects(start_buffer)) & (gdf.index != idx)].empty
-            end_intersects = not gdf[(gdf.geometry.intersects(end_buffer)) & (gdf.index != idx)].empty
+class StreetsStats:
+    """Thread safe counts of secondary streets layout attempts per network part."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._attempts = Counter()
+
+    def add(self, parts_attempts : list[int]):
+        logger.info(f'Secondary streets attempts per part: {parts_attempts}')
+        with self._lock:
+            self._attempts.update(parts_attempts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            parts = sum(self._attempts.values())
+            return {
+                'parts': parts,
+                'mean_attempts': sum(a * n for a, n in self._attempts.items()) / parts if parts > 0 else None,
+                'max_attempts': max(self._attempts, default=None),
+                'fallbacks': sum(n for a, n in self._attempts.items() if a > MAX_STREETS_ATTEMPTS),
+                'attempts': dict(sorted(self._attempts.items())),
+            }
+
+streets_stats = StreetsStats()
+
+@tracing.trace
+def _generate_part_network(part_geometry : shapely.Polygon, crs, seed : int) -> gpd.GeoDataFrame:
+    # the generator is local to the part, so concurrent requests and parts don't share random state
+    rng = np.random.default_rng(seed)
+
+    part_gdf = gpd.GeoDataFrame(geometry=[part_geometry], crs=crs)
+    
+    streets_gdf, streets_attempts = _generate_streets(part_gdf, rng)
+    first_blocks_gdf = _get_blocks(part_gdf, streets_gdf)
 
-            if start_intersects and end_intersects:
-                connected_lines.append(line)
-            elif start_intersects != end_intersects:
-                unconnected_lines.append(line)
+    ring_roads_gdf = _create_ring_roads(streets_gdf, first_blocks_gdf)
+    second_blocks_gdf = _get_blocks(first_blocks_gdf, ring_roads_gdf)
 
-    connected_lines_gdf = gpd.GeoDataFrame(connected_lines, columns=gdf.columns)
-    unconnected_lines_gdf = gpd.GeoDataFrame(unconnected_lines, columns=gdf.columns)
-    unconnected = _snap_endpoints(unconnected_lines_gdf, tolerance=100)
-    line_final = pd.concat([connected_lines_gdf, unconnected], ignore_index=True)
+    combined_first_roads = _longify_roads(ring_roads_gdf, streets_gdf)
+    street_precenter = _create_ring_roads(combined_first_roads, second_blocks_gdf) # TODO how to name it
 
-    return line_final.set_crs(gdf.crs)
+    # TODO from now on im not able to refactor and name everything
 
-def _generate_network(gdf : gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    project_polygon = gdf.iloc[0].geometry
-    num_parts = _calculate_num_parts(project_polygon)
-    parts_gdf = _polygon_to_parts(project_polygon, num_parts, gdf.crs)
-    results = []
+    result_gdf, result_lines, intersecting_polygons = _process_geodata(part_gdf, street_precenter, second_blocks_gdf)
+    lines_gdf = _find_intersections_and_create_lines(combined_first_roads, intersecting_polygons)
 
-    for part_geometry in parts_gdf.geometry:
-        part_gdf = gpd.GeoDataFrame(geometry=[part_geometry], crs=parts_gdf.crs)
-        
-        streets_gdf = _generate_streets(part_gdf)
-        first_blocks_gdf = _get_blocks(part_gdf, streets_gdf)
+    combined = pd.concat([result_lines, result_gdf, lines_gdf], ignore_index=True)
+    combined_gdf = _longify_roads(combined_first_roads, combined)
 
-        ring_roads_gdf = _create_ring_roads(streets_gdf, first_blocks_gdf)
-        second_blocks_gdf = _get_blocks(first_blocks_gdf, ring_roads_gdf)
+    split_territory = _get_blocks(part_gdf, combined_gdf)
+    central_gdf = _select_central_polygons(part_gdf, split_territory, rng)
 
-        combined_first_roads = _longify_roads(ring_roads_gdf, streets_gdf)
-        street_precenter = _create_ring_roads(combined_first_roads, second_blocks_gdf) # TODO how to name it
+    result_gdf = _create_ring_roads(combined_gdf, central_gdf)
+    combined_gdf = _longify_roads(combined_gdf, result_gdf)
 
-        # TODO from now on im not able to refactor and name everything
+    combined_gdf = _process_territory_graph(part_gdf, combined_gdf, intersecting_polygons)
+    # clip lines
+    combined_gdf = combined_gdf.clip(part_gdf).explode(index_parts=False).reset_index(drop=True)
+    # attrs are pickled with the result, so the attempts are known in the main process
+    combined_gdf.attrs['streets_attempts'] = streets_attempts
+    return combined_gdf
 
-        result_gdf, result_lines, intersecting_polygons = _process_geodata(part_gdf, street_precenter, second_blocks_gdf)
-        lines_gdf = _find_intersections_and_create_lines(combined_first_roads, intersecting_polygons)
+_parts_executor : ProcessPoolExecutor | None = None
+_parts_executor_lock = threading.Lock()
 
-        combined = pd.concat([result_lines, result_gdf, lines_gdf], ignore_index=True)
-        combined_gdf = _longify_roads(combined_first_roads, combined)
+def get_parts_executor() -> ProcessPoolExecutor:
+    # the pool is shared by requests, so its workers are spawned and import the module once
+    global _parts_executor
+    with _parts_executor_lock:
+        if _parts_executor is None:
+            _parts_executor = ProcessPoolExecutor(max_workers=const.NETWORK_MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _parts_executor
 
-        split_territory = _get_blocks(part_gdf, combined_gdf)
-        central_gdf = _select_central_polygons(part_gdf, split_territory)
+def shutdown_parts_executor():
+    global _parts_executor
+    with _parts_executor_lock:
+        if _parts_executor is not None:
+            _parts_executor.shutdown(wait=False, cancel_futures=True)
+            _parts_executor = None
 
-        result_gdf = _create_ring_roads(combined_gdf, central_gdf)
-        combined_gdf = _longify_roads(combined_gdf, result_gdf)
+def _get_parts_seeds(num_parts : int, seed_sequence : np.random.SeedSequence) -> list[int]:
+    # every part gets its own seed so the result doesn't depend on the order or the process parts are generated in
+    return [int(s) for s in seed_sequence.generate_state(num_parts)]
 
-        combined_gdf = _process_territory_graph(part_gdf, combined_gdf, intersecting_polygons)
-        # clip lines
-        combined_gdf = combined_gdf.clip(part_gdf).explode(index_parts=False).reset_index(drop=True)
-        results.append(combined_gdf)
+@tracing.trace
+def _generate_network(gdf : gpd.GeoDataFrame, seed_sequence : np.random.SeedSequence, max_workers : int = 1) -> gpd.GeoDataFrame:
+    project_polygon = gdf.iloc[0].geometry
+    num_parts = _calculate_num_parts(project_polygon)
+    parts_gdf = _polygon_to_parts(project_polygon, num_parts, gdf.crs)
+    parts_geometries = list(parts_gdf.geometry)
+    parts_seeds = _get_parts_seeds(len(parts_geometries), seed_sequence)
+    parts_crs = [parts_gdf.crs] * len(parts_geometries)
+
+    max_workers = min(max_workers, len(parts_geometries))
+    if max_workers > 1:
+        logger.info(f'Generating {len(parts_geometries)} parts with {max_workers} workers')
+        try:
+            results = list(get_parts_executor().map(_generate_part_network, parts_geometries, parts_crs, parts_seeds))
+        except BrokenProcessPool:
+            # a worker died, e.g. killed on OOM, the next request gets a new pool
+            shutdown_parts_executor()
+            raise
+    else:
+        results = list(map(_generate_part_network, parts_geometries, parts_crs, parts_seeds))
+    streets_stats.add([result.attrs['streets_attempts'] for result in results])
 
     final_result = gpd.GeoDataFrame(pd.concat(results, ignore_index=True), crs=gdf.crs)
     final_result = _process_territory(gdf, final_result)
@@ -515,14 +650,25 @@ def _generate_network(gdf : gpd.GeoDataFrame) -> gpd.GeoDataFrame:
 
     return line_final
 
-def generate_network(project_id : int, token : str):
+@tracing.trace
+def generate_network(project_id : int, token : str, seed : int | None = None, n_variants : int = 1):
     logger.info('Fetching project geometry')
     project_geometry = _fetch_project_geometry(project_id, token)
     project_gdf = gpd.GeoDataFrame(geometry=[project_geometry], crs=const.DEFAULT_CRS)
     local_crs = project_gdf.estimate_utm_crs()
     project_gdf = project_gdf.to_crs(local_crs)
     project_gdf = project_gdf.explode(index_parts=False).reset_index(drop=True)
-    return _generate_network(project_gdf)
+    # variants are generated from independent child sequences, so a variant doesn't depend on their number
+    variants = []
+    for i, seed_sequence in enumerate(np.random.SeedSequence(seed).spawn(n_variants)):
+        logger.info(f'Generating network variant {i + 1}/{n_variants}')
+        variant_gdf = _generate_network(project_gdf, seed_sequence, const.NETWORK_MAX_WORKERS)
+        if n_variants > 1:
+            variant_gdf['variant'] = i
+        variants.append(variant_gdf)
+    if n_variants == 1:
+        return variants[0]
+    return gpd.GeoDataFrame(pd.concat(variants, ignore_index=True), crs=local_crs)
 
 # def gedsfsdfsnerate_network(project_scenario_id : int, token : str):
 
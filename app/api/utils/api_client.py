@@ -1,10 +1,63 @@
-import requests
+import os
+import json
+import time
+import asyncio
+import hashlib
+import httpx
 import pandas as pd
 import geopandas as gpd
 from fastapi import HTTPException
-from .const import URBAN_API, DEFAULT_CRS
+from .const import URBAN_API, DEFAULT_CRS, DATA_PATH, URBAN_API_TIMEOUT, URBAN_API_RETRIES, URBAN_API_BACKOFF, URBAN_API_MAX_CONNECTIONS, URBAN_API_CACHE_SIZE, URBAN_API_CACHE_DISK
+from .cache import BytesCache
+from . import tracing
 
-def _raise_for_status(response : requests.Response):
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# seconds responses are cached for, scenario data is edited by users so it lives shorter than reference data
+SCENARIO_TTL = 60
+PROJECT_TTL = 10 * 60
+FUNCTIONAL_ZONES_SOURCES_TTL = 60
+FUNCTIONAL_ZONES_TTL = 60
+FUNCTIONAL_ZONES_TYPES_TTL = 24 * 60 * 60
+
+cache = BytesCache(URBAN_API_CACHE_SIZE, os.path.join(DATA_PATH, 'urban_api_cache') if URBAN_API_CACHE_DISK else None)
+
+_client : httpx.Client | None = None
+_async_client : httpx.AsyncClient | None = None
+
+def _client_kwargs() -> dict:
+    return {
+        'base_url': URBAN_API,
+        'timeout': httpx.Timeout(URBAN_API_TIMEOUT),
+        'limits': httpx.Limits(max_connections=URBAN_API_MAX_CONNECTIONS, max_keepalive_connections=URBAN_API_MAX_CONNECTIONS),
+    }
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        _client = httpx.Client(**_client_kwargs())
+    return _client
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_client_kwargs())
+    return _async_client
+
+def open_clients():
+    get_client()
+    get_async_client()
+
+async def close_clients():
+    global _client, _async_client
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+def _raise_for_status(response : httpx.Response):
     try:
         response.raise_for_status()
     except Exception as e:
@@ -16,31 +69,124 @@ def _headers_from_token(token : str | None):
         headers['Authorization'] = f'Bearer {token}'
     return headers
 
+def _get_backoff(attempt : int) -> float:
+    return URBAN_API_BACKOFF * 2 ** attempt
+
+def _is_last_attempt(attempt : int) -> bool:
+    return attempt >= URBAN_API_RETRIES
+
+def _get(path : str, token : str | None = None, params : dict | None = None) -> httpx.Response:
+    client = get_client()
+    for attempt in range(URBAN_API_RETRIES + 1):
+        try:
+            res = client.get(path, params=params, headers=_headers_from_token(token))
+        except httpx.TransportError as e:
+            if _is_last_attempt(attempt):
+                raise HTTPException(502, detail=str(e))
+        else:
+            if res.status_code not in RETRY_STATUS_CODES or _is_last_attempt(attempt):
+                _raise_for_status(res)
+                return res
+        time.sleep(_get_backoff(attempt))
+
+async def _get_async(path : str, token : str | None = None, params : dict | None = None) -> httpx.Response:
+    client = get_async_client()
+    for attempt in range(URBAN_API_RETRIES + 1):
+        try:
+            res = await client.get(path, params=params, headers=_headers_from_token(token))
+        except httpx.TransportError as e:
+            if _is_last_attempt(attempt):
+                raise HTTPException(502, detail=str(e))
+        else:
+            if res.status_code not in RETRY_STATUS_CODES or _is_last_attempt(attempt):
+                _raise_for_status(res)
+                return res
+        await asyncio.sleep(_get_backoff(attempt))
+
+def _cache_key(path : str, token : str | None, params : dict | None) -> str:
+    # responses are authorized per user, so the token is a part of the key
+    token_hash = None if token is None else hashlib.sha256(token.encode()).hexdigest()
+    return json.dumps([path, token_hash, params], sort_keys=True, default=str)
+
+def _get_content(path : str, ttl : float, token : str | None = None, params : dict | None = None) -> bytes:
+    key = _cache_key(path, token, params)
+    content = cache.get(key)
+    if content is None:
+        content = _get(path, token, params).content
+        cache.set(key, content, ttl)
+    return content
+
+async def _get_content_async(path : str, ttl : float, token : str | None = None, params : dict | None = None) -> bytes:
+    key = _cache_key(path, token, params)
+    # the cache may read and write disk, so it is used off the event loop
+    content = await asyncio.to_thread(cache.get, key)
+    if content is None:
+        res = await _get_async(path, token, params)
+        content = res.content
+        await asyncio.to_thread(cache.set, key, content, ttl)
+    return content
+
+def _get_json(path : str, ttl : float, token : str | None = None, params : dict | None = None):
+    return json.loads(_get_content(path, ttl, token, params))
+
+async def _get_json_async(path : str, ttl : float, token : str | None = None, params : dict | None = None):
+    return json.loads(await _get_content_async(path, ttl, token, params))
+
+def _functional_zones_params(year : int, source : str) -> dict:
+    return {
+        'year': year,
+        'source': source
+    }
+
+def _functional_zones_from_content(content : bytes) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame.from_features(json.loads(content)['features'], crs=DEFAULT_CRS)
+
+def _functional_zones_types_from_json(res_json : list[dict]) -> pd.DataFrame:
+    return pd.DataFrame(res_json).set_index('functional_zone_type_id')
+
+@tracing.trace
 def get_scenario_by_id(scenario_id : int, token : str | None):
-    res = requests.get(URBAN_API + f'/api/v1/scenarios/{scenario_id}', headers=_headers_from_token(token))
-    _raise_for_status(res)
-    return res.json()
+    return _get_json(f'/api/v1/scenarios/{scenario_id}', SCENARIO_TTL, token)
 
+@tracing.trace
 def get_project_by_id(project_id : int, token : str | None):
-    res = requests.get(URBAN_API + f'/api/v1/projects/{project_id}/territory', headers=_headers_from_token(token))
-    _raise_for_status(res)
-    return res.json()
+    return _get_json(f'/api/v1/projects/{project_id}/territory', PROJECT_TTL, token)
 
+@tracing.trace
 def get_functional_zones_sources(scenario_id : int, token : str | None):
-    res = requests.get(f'{URBAN_API}/api/v1/scenarios/{scenario_id}/functional_zone_sources', headers=_headers_from_token(token))
-    _raise_for_status(res)
-    return pd.DataFrame(res.json())
+    res_json = _get_json(f'/api/v1/scenarios/{scenario_id}/functional_zone_sources', FUNCTIONAL_ZONES_SOURCES_TTL, token)
+    return pd.DataFrame(res_json)
 
+@tracing.trace
 def get_functional_zones(scenario_id : int, year : int, source : str, token : str | None):
-    res = requests.get(f'{URBAN_API}/api/v1/scenarios/{scenario_id}/functional_zones', params={
-        'year': year,
-        'source': source
-    }, headers=_headers_from_token(token))
-    _raise_for_status(res)
-    return gpd.GeoDataFrame.from_features(res.json()['features'], crs=DEFAULT_CRS)
+    content = _get_content(f'/api/v1/scenarios/{scenario_id}/functional_zones', FUNCTIONAL_ZONES_TTL, token, _functional_zones_params(year, source))
+    return _functional_zones_from_content(content)
 
+@tracing.trace
 def get_functional_zones_types():
-    res = requests.get(f'{URBAN_API}/api/v1/functional_zones_types')
-    _raise_for_status(res)
-    res_json = res.json()
-    return pd.DataFrame(res_json).set_index('functional_zone_type_id')
+    res_json = _get_json('/api/v1/functional_zones_types', FUNCTIONAL_ZONES_TYPES_TTL)
+    return _functional_zones_types_from_json(res_json)
+
+@tracing.trace
+async def get_scenario_by_id_async(scenario_id : int, token : str | None):
+    return await _get_json_async(f'/api/v1/scenarios/{scenario_id}', SCENARIO_TTL, token)
+
+@tracing.trace
+async def get_project_by_id_async(project_id : int, token : str | None):
+    return await _get_json_async(f'/api/v1/projects/{project_id}/territory', PROJECT_TTL, token)
+
+@tracing.trace
+async def get_functional_zones_sources_async(scenario_id : int, token : str | None):
+    res_json = await _get_json_async(f'/api/v1/scenarios/{scenario_id}/functional_zone_sources', FUNCTIONAL_ZONES_SOURCES_TTL, token)
+    return pd.DataFrame(res_json)
+
+@tracing.trace
+async def get_functional_zones_async(scenario_id : int, year : int, source : str, token : str | None):
+    content = await _get_content_async(f'/api/v1/scenarios/{scenario_id}/functional_zones', FUNCTIONAL_ZONES_TTL, token, _functional_zones_params(year, source))
+    # large collections are parsed in a thread so other requests are served meanwhile
+    return await asyncio.to_thread(_functional_zones_from_content, content)
+
+@tracing.trace
+async def get_functional_zones_types_async():
+    res_json = await _get_json_async('/api/v1/functional_zones_types', FUNCTIONAL_ZONES_TYPES_TTL)
+    return _functional_zones_types_from_json(res_json)
@@ -0,0 +1,145 @@
+import os
+import time
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+_HEADER = struct.Struct('d')
+
+class BytesCache:
+    """
+    LRU cache of bytes values bounded by their total size in bytes.
+
+    Every entry may have its own time to live. Values are kept in memory or, if `directory` is provided,
+    in files of this directory, so the cache survives restarts. The index of entries (sizes, expiration time
+    and recency) is always kept in memory and is restored from the directory on initialization.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum total size of stored values in bytes. Least recently used entries are evicted above it.
+    directory : str | None
+        Directory to store values in. Values are kept in memory if None.
+    """
+
+    def __init__(self, max_size : int, directory : str | None = None):
+        self.max_size = max_size
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._index : OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._values : dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+
+    @staticmethod
+    def hash_key(key : str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, key_hash : str) -> str:
+        return os.path.join(self.directory, key_hash)
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            path = self._path(name)
+            try:
+                with open(path, 'rb') as f:
+                    expires_at, = _HEADER.unpack(f.read(_HEADER.size))
+                entries.append((os.path.getmtime(path), name, os.path.getsize(path) - _HEADER.size, expires_at))
+            except (OSError, struct.error):
+                continue
+        for _, name, size, expires_at in sorted(entries):
+            self._index[name] = (size, expires_at)
+            self._size += size
+        self._evict()
+
+    def _read(self, key_hash : str) -> bytes | None:
+        if self.directory is None:
+            return self._values.get(key_hash)
+        try:
+            with open(self._path(key_hash), 'rb') as f:
+                return f.read()[_HEADER.size:]
+        except OSError:
+            return None
+
+    def _write(self, key_hash : str, value : bytes, expires_at : float):
+        if self.directory is None:
+            self._values[key_hash] = value
+            return
+        tmp_path = self._path(key_hash) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(expires_at))
+            f.write(value)
+        os.replace(tmp_path, self._path(key_hash))
+
+    def _delete(self, key_hash : str):
+        size, _ = self._index.pop(key_hash)
+        self._size -= size
+        if self.directory is None:
+            self._values.pop(key_hash, None)
+            return
+        try:
+            os.remove(self._path(key_hash))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._size > self.max_size and len(self._index) > 0:
+            key_hash = next(iter(self._index))
+            self._delete(key_hash)
+            self.evictions += 1
+
+    def get(self, key : str) -> bytes | None:
+        key_hash = self.hash_key(key)
+        with self._lock:
+            entry = self._index.get(key_hash)
+            value = None
+            if entry is not None:
+                _, expires_at = entry
+                if expires_at >= time.time():
+                    value = self._read(key_hash)
+                if value is None:
+                    self._delete(key_hash)
+            if value is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key_hash)
+            self.hits += 1
+            return value
+
+    def set(self, key : str, value : bytes, ttl : float | None = None):
+        if len(value) > self.max_size:
+            return
+        key_hash = self.hash_key(key)
+        expires_at = float('inf') if ttl is None else time.time() + ttl
+        with self._lock:
+            if key_hash in self._index:
+                self._delete(key_hash)
+            self._write(key_hash, value, expires_at)
+            self._index[key_hash] = (len(value), expires_at)
+            self._size += len(value)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key_hash in list(self._index):
+                self._delete(key_hash)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._index),
+                'size': self._size,
+                'max_size': self.max_size,
+            }
@@ -13,4 +13,38 @@ if "URBAN_API" in os.environ:
 else:
     raise Exception('Cannot find URBAN_API in env')
 
-DEFAULT_CRS = 4326
\ No newline at end of file
+URBAN_API_TIMEOUT = float(os.environ.get('URBAN_API_TIMEOUT', 60))
+URBAN_API_RETRIES = int(os.environ.get('URBAN_API_RETRIES', 3))
+URBAN_API_BACKOFF = float(os.environ.get('URBAN_API_BACKOFF', 0.5))
+URBAN_API_MAX_CONNECTIONS = int(os.environ.get('URBAN_API_MAX_CONNECTIONS', 100))
+# total size of cached Urban API responses in bytes, responses are stored under DATA_PATH if URBAN_API_CACHE_DISK is set
+URBAN_API_CACHE_SIZE = int(os.environ.get('URBAN_API_CACHE_SIZE', 256 * 1024 * 1024))
+URBAN_API_CACHE_DISK = os.environ.get('URBAN_API_CACHE_DISK', '').lower() in ('1', 'true', 'yes')
+
+# total size in bytes and seconds responses of deterministic endpoints are cached for under DATA_PATH
+RESULTS_CACHE_SIZE = int(os.environ.get('RESULTS_CACHE_SIZE', 1024 * 1024 * 1024))
+RESULTS_CACHE_TTL = float(os.environ.get('RESULTS_CACHE_TTL', 24 * 60 * 60))
+
+DEFAULT_CRS = 4326
+
+# if set, coordinates of GeoJSON responses are rounded to the grid of this size, e.g. 0.00001 degrees is about a meter
+PRECISION_GRID_SIZE = float(os.environ['PRECISION_GRID_SIZE']) if os.environ.get('PRECISION_GRID_SIZE') else None
+# if set, GeoJSON request bodies of trusted clients are read in bulk without per coordinate pydantic validation
+FAST_INGEST = os.environ.get('FAST_INGEST', '').lower() in ('1', 'true', 'yes')
+
+# number of processes used to generate network parts concurrently, 1 means sequential generation
+NETWORK_MAX_WORKERS = int(os.environ.get('NETWORK_MAX_WORKERS', 1))
+
+# number of scenarios processed at once by /indicators/predict_batch
+INDICATORS_BATCH_MAX_CONCURRENCY = int(os.environ.get('INDICATORS_BATCH_MAX_CONCURRENCY', 8))
+
+# number of background jobs running at once and seconds their results are kept for
+JOBS_MAX_WORKERS = int(os.environ.get('JOBS_MAX_WORKERS', 2))
+JOBS_TTL = float(os.environ.get('JOBS_TTL', 24 * 60 * 60))
+
+# memory budget in bytes and seconds since the last access for cached land use optimization sessions
+LAND_USE_SESSIONS_MAX_SIZE = int(os.environ.get('LAND_USE_SESSIONS_MAX_SIZE', 512 * 1024 * 1024))
+LAND_USE_SESSIONS_TTL = float(os.environ.get('LAND_USE_SESSIONS_TTL', 60 * 60))
+
+# if set, requests with X-Profile header are profiled and their cProfile stats are written under DATA_PATH
+PROFILING = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
@@ -1,17 +1,45 @@
-import json
+import typing
+import inspect
 import geopandas as gpd
 from functools import wraps
-from shapely import set_precision
+from fastapi import Header
+from pydantic import BaseModel
 from .const import DEFAULT_CRS
+from .serialization import ACCEPT_DESCRIPTION, gdf_response, negotiate_media_type
 
-# PRECISION_GRID_SIZE = 0.00001
+def _get_properties_model(model) -> type[BaseModel] | None:
+    # properties model of features of a FeatureCollection model, None if properties are arbitrary
+    try:
+        feature_model, = typing.get_args(model.model_fields['features'].annotation)
+        properties_model = feature_model.model_fields['properties'].annotation
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    if inspect.isclass(properties_model) and issubclass(properties_model, BaseModel):
+        return properties_model
+    return None
+
+def _select_properties(gdf : gpd.GeoDataFrame, properties_model : type[BaseModel] | None) -> gpd.GeoDataFrame:
+    # responses aren't validated, so columns are cut to the declared properties and missing ones get their defaults,
+    # optional properties without a default are only kept if present
+    if properties_model is None:
+        return gdf
+    columns = []
+    for name, field in properties_model.model_fields.items():
+        if name not in gdf.columns:
+            if field.is_required() or field.get_default() is None:
+                continue
+            gdf = gdf.assign(**{name : field.get_default()})
+        columns.append(name)
+    return gdf[[*columns, gdf.geometry.name]]
 
 def gdf_to_geojson(func):
     """
     A decorator that processes a GeoDataFrame returned by an asynchronous function and converts it to GeoJSON format with specified CRS and geometry precision.
 
     This decorator takes an asynchronous function that returns a GeoDataFrame, transforms its coordinate system to EPSG:4326, 
-    and optionally adjusts the geometry precision based on a defined grid size. The final result is a GeoJSON-compatible dictionary.
+    and optionally adjusts the geometry precision based on a defined grid size. The final result is a response with GeoJSON bytes,
+    which is returned as is, without validation against the response model of the endpoint. GeoParquet or Arrow IPC stream
+    is returned instead if requested in the ``Accept`` header.
 
     Parameters
     ----------
@@ -21,12 +49,13 @@ def gdf_to_geojson(func):
     Returns
     -------
     Callable
-        A wrapped asynchronous function that returns the GeoDataFrame as a GeoJSON-compatible dictionary.
+        A wrapped asynchronous function that returns the GeoDataFrame as a GeoJSON response.
 
     Notes
     -----
     - The decorator converts the GeoDataFrame to EPSG:4326 (WGS 84).
-    - Geometry precision is adjusted using the `set_precision` function and a grid size defined by `PRECISION_GRID_SIZE`.
+    - If features properties of the return annotation are a model, only its fields are returned, missing ones with defaults.
+    - Geometry precision is adjusted using the `set_precision` function if `PRECISION_GRID_SIZE` is set in env.
     - Commented-out code allows optional rounding for columns containing 'provision' in their name, if enabled.
     
     Examples
@@ -38,9 +67,19 @@ def gdf_to_geojson(func):
         return gdf
     ```
     """
+    properties_model = _get_properties_model(inspect.signature(func).return_annotation)
+
     @wraps(func)
-    def process(*args, **kwargs):
-        gdf = func(*args, **kwargs).to_crs(DEFAULT_CRS)
-        # gdf.geometry = set_precision(gdf.geometry, grid_size=PRECISION_GRID_SIZE)
-        return json.loads(gdf.to_json())
+    def process(*args, accept : str | None = None, **kwargs):
+        gdf = _select_properties(func(*args, **kwargs), properties_model).to_crs(DEFAULT_CRS)
+        return gdf_response(gdf, negotiate_media_type(accept))
+    # the Accept header is added to the endpoint parameters, so FastAPI passes it to the wrapper
+    signature = inspect.signature(func)
+    accept = inspect.Parameter(
+        'accept',
+        inspect.Parameter.KEYWORD_ONLY,
+        default=Header(None, description=ACCEPT_DESCRIPTION),
+        annotation=str | None
+    )
+    process.__signature__ = signature.replace(parameters=[*signature.parameters.values(), accept])
     return process
\ No newline at end of file
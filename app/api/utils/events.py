@@ -0,0 +1,82 @@
+import json
+import asyncio
+import threading
+from typing import Callable, Iterator, AsyncIterator
+from loguru import logger
+
+class Cancelled(Exception):
+    """Raised inside a streamed function when its client is gone."""
+
+def add_stages_sink(report_stage : Callable[[str], None], thread_id : int | None = None) -> int:
+    """
+    Adds a loguru sink reporting numbered pipeline log messages (e.g. ``'1.1. Fetching project geometry'``) as stages.
+
+    Parameters
+    ----------
+    report_stage : Callable[[str], None]
+        Function called with every stage message.
+    thread_id : int | None
+        If provided, only messages logged by this thread are reported.
+
+    Returns
+    -------
+    int
+        Sink id to remove it with `logger.remove`.
+    """
+    def filter(record):
+        if thread_id is not None and record['thread'].id != thread_id:
+            return False
+        return record['message'][:1].isdigit()
+    return logger.add(lambda message : report_stage(message.record['message']), level='INFO', filter=filter)
+
+def format_event(event : str, data) -> str:
+    # data may be already serialized to JSON bytes
+    data = data.decode() if isinstance(data, bytes) else json.dumps(data, ensure_ascii=False)
+    return f'event: {event}\ndata: {data}\n\n'
+
+async def stream_events(func : Callable[..., Iterator], *args, **kwargs) -> AsyncIterator[str]:
+    """
+    Runs `func(*args, **kwargs, report_progress=...)` in a thread and streams its execution as Server-Sent Events.
+
+    Events are ``stage`` for pipeline log messages, ``progress`` for values passed to ``report_progress``,
+    ``result`` for every item yielded by `func`, and finally ``done`` or ``error``. When the stream is closed
+    by the client, the next ``report_progress`` call or yielded item raises `Cancelled` in the thread.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def put(event : str | None, data = None):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def report_progress(**progress):
+        if cancelled.is_set():
+            raise Cancelled()
+        put('progress', progress)
+
+    def run():
+        sink_id = add_stages_sink(lambda stage : put('stage', {'stage': stage}), threading.get_ident())
+        try:
+            for item in func(*args, **kwargs, report_progress=report_progress):
+                if cancelled.is_set():
+                    raise Cancelled()
+                put('result', item)
+            put('done', {})
+        except Cancelled:
+            logger.info('Stream is cancelled by the client')
+        except Exception as e:
+            put('error', {'detail': str(e)})
+        finally:
+            logger.remove(sink_id)
+            put(None)
+
+    task = loop.run_in_executor(None, run)
+    try:
+        while True:
+            event, data = await queue.get()
+            if event is None:
+                break
+            yield format_event(event, data)
+    finally:
+        cancelled.set()
+    await task
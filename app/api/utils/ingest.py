@@ -0,0 +1,95 @@
+import orjson
+import shapely
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from .const import DEFAULT_CRS, FAST_INGEST
+from .serialization import BinaryBodyRoute
+
+POLYGON_TYPES = ('Polygon', 'MultiPolygon')
+LINE_TYPES = ('LineString', 'MultiLineString')
+
+class FastIngestRoute(BinaryBodyRoute):
+    """
+    Route which also hides JSON request bodies from FastAPI body parameters parsing if `FAST_INGEST` is set in env.
+
+    The body is available as ``request.state.json_body`` to be read by `loads` and `read_feature_collection`
+    instead of per coordinate pydantic validation. Body parameters still document the endpoint in OpenAPI.
+    """
+
+    def get_body_state_name(self, request : Request) -> str | None:
+        state_name = super().get_body_state_name(request)
+        if state_name is None and FAST_INGEST and request.headers.get('content-type', '').split(';')[0].strip() == 'application/json':
+            return 'json_body'
+        return state_name
+
+def _error(loc : tuple, msg : str) -> dict:
+    return {'type': 'value_error', 'loc': ('body', *loc), 'msg': msg, 'input': None}
+
+def loads(content : bytes):
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([{'type': 'json_invalid', 'loc': ('body', e.pos), 'msg': 'JSON decode error', 'input': {}, 'ctx': {'error': e.msg}}])
+
+def read_feature_collection(data, loc : tuple, geometry_types : tuple[str, ...], check_validity : bool = True) -> gpd.GeoDataFrame:
+    """
+    Reads a GeoJSON FeatureCollection parsed by `loads` into a GeoDataFrame in EPSG:4326.
+
+    Only the structure of features is checked in Python, geometries are read by shapely at once.
+
+    Parameters
+    ----------
+    data
+        Parsed FeatureCollection.
+    loc : tuple
+        Location of the collection in the body to report errors at.
+    geometry_types : tuple[str, ...]
+        Allowed GeoJSON geometry types.
+    check_validity : bool
+        Whether invalid geometries (self-intersections etc.) are reported as errors.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        Features with their properties as columns.
+
+    Raises
+    ------
+    RequestValidationError
+        With errors of all invalid features, which FastAPI reports as 422 response.
+    """
+    if not isinstance(data, dict) or data.get('type') != 'FeatureCollection' or not isinstance(data.get('features'), list):
+        raise RequestValidationError([_error(loc, 'Input should be a GeoJSON FeatureCollection')])
+    features = data['features']
+    errors = []
+    for i, feature in enumerate(features):
+        geometry = feature.get('geometry') if isinstance(feature, dict) else None
+        if not isinstance(geometry, dict) or geometry.get('type') not in geometry_types:
+            errors.append(_error((*loc, 'features', i, 'geometry'), f'Geometry type should be one of {", ".join(geometry_types)}'))
+        elif not isinstance(feature.get('properties', {}), dict):
+            errors.append(_error((*loc, 'features', i, 'properties'), 'Input should be a valid dictionary'))
+    if len(errors) > 0:
+        raise RequestValidationError(errors)
+
+    geometries_json = orjson.dumps({'type': 'GeometryCollection', 'geometries': [feature['geometry'] for feature in features]})
+    try:
+        geometries = shapely.get_parts(shapely.from_geojson(geometries_json))
+    except shapely.errors.GEOSException as e:
+        raise RequestValidationError([_error(loc, f'Invalid geometry: {e}')])
+    if len(geometries) != len(features):
+        raise RequestValidationError([_error(loc, 'Geometries should not be empty')])
+    empty = np.flatnonzero(shapely.is_empty(geometries))
+    if len(empty) > 0:
+        raise RequestValidationError([_error((*loc, 'features', int(i), 'geometry'), 'Geometry should not be empty') for i in empty])
+
+    if check_validity:
+        invalid = np.flatnonzero(~shapely.is_valid(geometries))
+        if len(invalid) > 0:
+            reasons = shapely.is_valid_reason(geometries[invalid])
+            raise RequestValidationError([_error((*loc, 'features', int(i), 'geometry'), reason) for i, reason in zip(invalid, reasons)])
+
+    properties = pd.DataFrame([feature.get('properties') or {} for feature in features], index=range(len(features)))
+    return gpd.GeoDataFrame(properties, geometry=geometries, crs=DEFAULT_CRS)
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import multiprocessing
+from enum import Enum
+from typing import Any, Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from loguru import logger
+from pydantic import BaseModel
+from .events import add_stages_sink
+from .const import DATA_PATH, JOBS_MAX_WORKERS, JOBS_TTL
+
+JOBS_PATH = os.path.join(DATA_PATH, 'jobs')
+PROGRESS_INTERVAL = 0.5
+
+class JobStatus(Enum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILURE = 'failure'
+
+class JobInfo(BaseModel):
+    job_id : str
+    status : JobStatus
+    created_at : float
+    started_at : float | None = None
+    finished_at : float | None = None
+    progress : dict[str, Any] = {}
+    error : str | None = None
+
+def _is_job_id(job_id : str) -> bool:
+    return len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+def _job_path(job_id : str, file_name : str | None = None) -> str:
+    if file_name is None:
+        return os.path.join(JOBS_PATH, job_id)
+    return os.path.join(JOBS_PATH, job_id, file_name)
+
+def _write_json(path : str, data):
+    _write_bytes(path, json.dumps(data, ensure_ascii=False).encode())
+
+def _write_bytes(path : str, data : bytes):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _read_json(path : str):
+    with open(path) as f:
+        return json.load(f)
+
+class ProgressReporter:
+    """
+    Callable passed to a job function to report its progress, e.g. ``report(stage='1. Generating blocks')``.
+
+    Reported values are merged into the job progress, which is flushed to disk not more often than every
+    `PROGRESS_INTERVAL` seconds unless the stage changes.
+    """
+
+    def __init__(self, job_info : JobInfo):
+        self.job_info = job_info
+        self._flushed_at = 0
+
+    def __call__(self, **progress):
+        stage_changed = progress.get('stage', self.job_info.progress.get('stage')) != self.job_info.progress.get('stage')
+        self.job_info.progress.update(progress)
+        if stage_changed or time.time() - self._flushed_at >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        _write_json(_job_path(self.job_info.job_id, 'info.json'), self.job_info.model_dump(mode='json'))
+        self._flushed_at = time.time()
+
+def _run_job(job_id : str, func : Callable, args : tuple, kwargs : dict):
+    # executed in a worker process, every state change is written to the job directory
+    job_info = JobInfo(**_read_json(_job_path(job_id, 'info.json')))
+    job_info.status = JobStatus.RUNNING
+    job_info.started_at = time.time()
+    reporter = ProgressReporter(job_info)
+    reporter.flush()
+    sink_id = add_stages_sink(lambda stage : reporter(stage=stage))
+    try:
+        result = func(*args, **kwargs, report_progress=reporter)
+        if isinstance(result, bytes):
+            _write_bytes(_job_path(job_id, 'result.json'), result)
+        else:
+            _write_json(_job_path(job_id, 'result.json'), result)
+        job_info.status = JobStatus.SUCCESS
+    except Exception as e:
+        job_info.status = JobStatus.FAILURE
+        job_info.error = str(e)
+    finally:
+        logger.remove(sink_id)
+    job_info.finished_at = time.time()
+    reporter.flush()
+
+class JobsManager:
+    """
+    Runs long jobs in a pool of worker processes.
+
+    Job state, progress and result are stored as files under ``DATA_PATH/jobs/<job_id>``, so any API
+    process can report on a job submitted by another one. Finished jobs are removed after `ttl` seconds.
+
+    Parameters
+    ----------
+    max_workers : int
+        Maximum number of jobs running at once, other jobs wait in the queue.
+    ttl : float
+        Seconds finished jobs are kept for.
+    """
+
+    def __init__(self, max_workers : int = JOBS_MAX_WORKERS, ttl : float = JOBS_TTL):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._executor = None
+        os.makedirs(JOBS_PATH, exist_ok=True)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def submit(self, func : Callable, *args, **kwargs) -> str:
+        """Submits `func(*args, **kwargs, report_progress=...)` for execution, `func` must return a JSON serializable result or JSON bytes."""
+        self.remove_expired()
+        job_id = uuid.uuid4().hex
+        os.makedirs(_job_path(job_id))
+        job_info = JobInfo(job_id=job_id, status=JobStatus.PENDING, created_at=time.time())
+        _write_json(_job_path(job_id, 'info.json'), job_info.model_dump(mode='json'))
+        executor = self.executor
+        future = executor.submit(_run_job, job_id, func, args, kwargs)
+        future.add_done_callback(lambda future : self._on_job_done(job_id, executor, future))
+        return job_id
+
+    def _on_job_done(self, job_id : str, executor : ProcessPoolExecutor, future : Future):
+        # job exceptions are caught by the worker, so here the job is cancelled or its worker died, e.g. killed on OOM
+        if future.cancelled():
+            error = 'Job is cancelled'
+        elif future.exception() is not None:
+            error = f'Job worker failed: {future.exception()!r}'
+            if isinstance(future.exception(), BrokenProcessPool) and self._executor is executor:
+                # the broken pool doesn't accept jobs anymore, the next job gets a new one
+                self._executor = None
+        else:
+            return
+        job_info = self.get_info(job_id)
+        if job_info is None or job_info.finished_at is not None:
+            return
+        logger.error(f'Job {job_id} failed: {error}')
+        job_info.status = JobStatus.FAILURE
+        job_info.error = error
+        job_info.finished_at = time.time()
+        _write_json(_job_path(job_id, 'info.json'), job_info.model_dump(mode='json'))
+
+    def get_info(self, job_id : str) -> JobInfo | None:
+        if not _is_job_id(job_id):
+            return None
+        try:
+            return JobInfo(**_read_json(_job_path(job_id, 'info.json')))
+        except (OSError, ValueError):
+            return None
+
+    def get_result(self, job_id : str) -> bytes:
+        with open(_job_path(job_id, 'result.json'), 'rb') as f:
+            return f.read()
+
+    def remove_expired(self):
+        for job_id in os.listdir(JOBS_PATH):
+            job_info = self.get_info(job_id)
+            if job_info is not None and job_info.finished_at is not None and time.time() - job_info.finished_at > self.ttl:
+                shutil.rmtree(_job_path(job_id), ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+_jobs_manager : JobsManager | None = None
+
+def get_jobs_manager() -> JobsManager:
+    global _jobs_manager
+    if _jobs_manager is None:
+        _jobs_manager = JobsManager()
+    return _jobs_manager
+
+def shutdown_jobs_manager():
+    global _jobs_manager
+    if _jobs_manager is not None:
+        _jobs_manager.shutdown()
+        _jobs_manager = None
@@ -0,0 +1,133 @@
+import os
+import json
+import asyncio
+import hashlib
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from starlette.requests import Request
+from typing import Callable
+from starlette.datastructures import Headers, QueryParams
+from .const import DATA_PATH, RESULTS_CACHE_SIZE, RESULTS_CACHE_TTL
+from .cache import BytesCache
+from .serialization import negotiate_media_type
+
+cache = BytesCache(RESULTS_CACHE_SIZE, os.path.join(DATA_PATH, 'results_cache'))
+
+bool_adapter = TypeAdapter(bool)
+
+def is_false(value : str) -> bool:
+    """If a query parameter value is false as FastAPI parses it, invalid values are not false."""
+    try:
+        return not bool_adapter.validate_python(value)
+    except ValidationError:
+        return False
+
+def _normalize_body(body : bytes, content_type : str) -> bytes:
+    # equal payloads with another formatting, keys order or multipart boundary get the same key
+    media_type, *params = [part.strip() for part in content_type.split(';')]
+    if media_type == 'application/json':
+        try:
+            return orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONDecodeError:
+            return body
+    if media_type == 'multipart/form-data':
+        for param in params:
+            if param.startswith('boundary='):
+                return body.replace(param[len('boundary='):].strip('"').encode(), b'boundary')
+    return body
+
+def get_key(path : str, query_params : list[tuple[str, str]], headers : Headers, body : bytes) -> str:
+    """Canonical hash of a request: endpoint, query parameters, user token, response format and normalized body."""
+    authorization = headers.get('authorization')
+    token_hash = None if authorization is None else hashlib.sha256(authorization.encode()).hexdigest()
+    body_hash = hashlib.sha256(_normalize_body(body, headers.get('content-type', ''))).hexdigest()
+    media_type = negotiate_media_type(headers.get('accept'))
+    return json.dumps([path, sorted(query_params), token_hash, media_type, body_hash])
+
+def _get_etag(content : bytes) -> str:
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+def _pack(media_type : str, content : bytes) -> bytes:
+    return media_type.encode() + b'\n' + content
+
+def _unpack(value : bytes) -> tuple[str, bytes]:
+    media_type, content = value.split(b'\n', 1)
+    return media_type.decode(), content
+
+class ResultsCacheMiddleware:
+    """
+    Caches successful responses of deterministic POST endpoints by the canonical hash of their requests.
+
+    Responses have ``ETag`` header, requests with a matching ``If-None-Match`` header get 304 response.
+
+    Parameters
+    ----------
+    app
+        ASGI application.
+    paths : dict[str, Callable[[QueryParams], bool]]
+        Cached endpoints paths with functions telling by query parameters if a request is deterministic,
+        e.g. if ``seed`` is provided.
+    """
+
+    def __init__(self, app, paths : dict[str, Callable[[QueryParams], bool]]):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+        request = Request(scope, receive)
+        query_params = request.query_params.multi_items()
+        if not self.paths[scope['path']](request.query_params):
+            return await self.app(scope, receive, send)
+
+        body = await request.body()
+        key = await asyncio.to_thread(get_key, scope['path'], query_params, request.headers, body)
+        if_none_match = request.headers.get('if-none-match')
+
+        # the cache may read and write disk, so it is used off the event loop
+        value = await asyncio.to_thread(cache.get, key)
+        if value is not None:
+            media_type, content = _unpack(value)
+            return await self._send(send, media_type, content, if_none_match)
+
+        body_sent = False
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        start_message = None
+        chunks = []
+        async def buffer_send(message):
+            nonlocal start_message
+            if message['type'] == 'http.response.start':
+                start_message = message
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, replay_receive, buffer_send)
+        content = b''.join(chunks)
+        if start_message['status'] != 200:
+            await send(start_message)
+            return await send({'type': 'http.response.body', 'body': content})
+
+        media_type = Headers(raw=start_message['headers']).get('content-type', 'application/json')
+        await asyncio.to_thread(cache.set, key, _pack(media_type, content), RESULTS_CACHE_TTL)
+        await self._send(send, media_type, content, if_none_match, start_message['headers'])
+
+    async def _send(self, send, media_type : str, content : bytes, if_none_match : str | None, headers : list | None = None):
+        etag = _get_etag(content)
+        headers = [(k, v) for k, v in headers or [] if k not in (b'content-length', b'etag')]
+        if not any(k == b'content-type' for k, _ in headers):
+            headers.append((b'content-type', media_type.encode()))
+        headers.append((b'etag', etag.encode()))
+        if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            headers = [(k, v) for k, v in headers if k != b'content-type']
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            return await send({'type': 'http.response.body', 'body': b''})
+        headers.append((b'content-length', str(len(content)).encode()))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
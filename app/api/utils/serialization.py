@@ -0,0 +1,168 @@
+import io
+import orjson
+import shapely
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import geopandas as gpd
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+from .const import PRECISION_GRID_SIZE, DEFAULT_CRS
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+GEOJSON = 'application/json'
+GEOPARQUET = 'application/vnd.apache.parquet'
+ARROW = 'application/vnd.apache.arrow.stream'
+BINARY_MEDIA_TYPES = [GEOPARQUET, ARROW]
+# documents binary responses of endpoints in OpenAPI, GeoJSON is documented by the response model
+BINARY_RESPONSES = {200: {'content': {media_type : {} for media_type in BINARY_MEDIA_TYPES}}}
+ACCEPT_DESCRIPTION = f'{GEOJSON} (default), {GEOPARQUET} or {ARROW}'
+
+PARQUET_MAGIC = b'PAR1'
+
+class JSONBytesResponse(Response):
+    """Response with already serialized JSON content, which bypasses response model validation and encoding."""
+    media_type = 'application/json'
+
+def _default(obj):
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+def gdf_to_geojson(gdf : gpd.GeoDataFrame, grid_size : float | None = PRECISION_GRID_SIZE) -> bytes:
+    """
+    Serializes a GeoDataFrame to GeoJSON FeatureCollection bytes, the same as ``gdf.to_json()`` does but in bulk.
+
+    Geometries are written by shapely for the whole array at once and properties by orjson,
+    so no intermediate Python dicts of coordinates are created.
+
+    Parameters
+    ----------
+    gdf : gpd.GeoDataFrame
+        GeoDataFrame to serialize, it is not transformed to another CRS.
+    grid_size : float | None
+        If provided, coordinates are rounded to the grid of this size. Defaults to `PRECISION_GRID_SIZE`.
+
+    Returns
+    -------
+    bytes
+        GeoJSON FeatureCollection.
+    """
+    geometries = gdf.geometry.values.to_numpy()
+    if grid_size is not None:
+        geometries = shapely.set_precision(geometries, grid_size=grid_size)
+    # empty geometries, e.g. polygons collapsed by the precision grid, are null as in gdf.to_json()
+    geometries = shapely.to_geojson(np.where(shapely.is_empty(geometries), None, geometries))
+    properties = gdf.drop(columns=gdf.geometry.name).to_dict('records')
+    features = [
+        b'{"id":' + dumps(str(i)) + b',"type":"Feature","properties":' + dumps(p) + b',"geometry":' + (b'null' if g is None else g.encode()) + b'}'
+        for i, p, g in zip(gdf.index, properties, geometries)
+    ]
+    return b'{"type":"FeatureCollection","features":[' + b','.join(features) + b']}'
+
+def negotiate_media_type(accept : str | None) -> str:
+    """Returns the most preferred binary media type of `accept` header value or GeoJSON if there is none."""
+    if accept is None:
+        return GEOJSON
+    media_types = []
+    for i, item in enumerate(accept.split(',')):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        media_types.append((-q, i, media_type))
+    for _, _, media_type in sorted(media_types):
+        if media_type in BINARY_MEDIA_TYPES:
+            return media_type
+        if media_type in (GEOJSON, 'application/geo+json', 'application/*', '*/*'):
+            return GEOJSON
+    return GEOJSON
+
+def is_binary_content_type(content_type : str | None) -> bool:
+    return content_type is not None and content_type.split(';')[0].strip() in BINARY_MEDIA_TYPES
+
+class BinaryBodyRoute(APIRoute):
+    """
+    Route which hides GeoParquet and Arrow IPC request bodies from FastAPI body parameters parsing.
+
+    The body is available as ``request.state.binary_body`` and body parameters are left empty, so an endpoint
+    with a single JSON body parameter may accept binary bodies too.
+    """
+
+    def get_body_state_name(self, request : Request) -> str | None:
+        # name of request.state attribute to keep the body in, the body is parsed by FastAPI if None
+        if is_binary_content_type(request.headers.get('content-type')):
+            return 'binary_body'
+        return None
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request : Request) -> Response:
+            state_name = self.get_body_state_name(request)
+            if state_name is not None:
+                setattr(request.state, state_name, await request.body())
+                scope = {**request.scope, 'headers': [(k, v) for k, v in request.scope['headers'] if k != b'content-type']}
+                async def receive():
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                request = Request(scope, receive)
+            return await handler(request)
+
+        return route_handler
+
+def gdf_to_binary(gdf : gpd.GeoDataFrame, media_type : str) -> bytes:
+    """Serializes a GeoDataFrame to GeoParquet or Arrow IPC stream bytes with WKB geometry."""
+    if media_type == GEOPARQUET:
+        buffer = io.BytesIO()
+        gdf.to_parquet(buffer, geometry_encoding='WKB')
+        return buffer.getvalue()
+    table = pa.table(gdf.to_arrow(geometry_encoding='WKB'))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _gdf_from_wkb_df(df : pd.DataFrame) -> gpd.GeoDataFrame:
+    # plain tables without geo metadata are expected to have WKB geometry in WGS 84
+    if 'geometry' not in df.columns:
+        raise HTTPException(400, 'Table must have a geometry column')
+    geometry = shapely.from_wkb(df.pop('geometry').to_numpy())
+    return gpd.GeoDataFrame(df, geometry=geometry, crs=DEFAULT_CRS)
+
+def gdf_from_binary(content : bytes) -> gpd.GeoDataFrame:
+    """
+    Deserializes a GeoDataFrame from GeoParquet or Arrow IPC stream bytes, the format is recognized by its content.
+
+    Tables without geo metadata must have a WKB ``geometry`` column in EPSG:4326.
+    """
+    try:
+        if content[:len(PARQUET_MAGIC)] == PARQUET_MAGIC:
+            try:
+                gdf = gpd.read_parquet(io.BytesIO(content))
+            except ValueError:
+                return _gdf_from_wkb_df(pd.read_parquet(io.BytesIO(content)))
+        else:
+            table = pa.ipc.open_stream(content).read_all()
+            try:
+                gdf = gpd.GeoDataFrame.from_arrow(table)
+            except ValueError:
+                return _gdf_from_wkb_df(table.to_pandas())
+    except (pa.ArrowException, OSError) as e:
+        raise HTTPException(400, f'Cannot read GeoParquet or Arrow IPC stream: {e}')
+    if gdf.crs is None:
+        gdf = gdf.set_crs(DEFAULT_CRS)
+    return gdf
+
+def gdf_response(gdf : gpd.GeoDataFrame, media_type : str) -> Response:
+    if media_type == GEOJSON:
+        return JSONBytesResponse(gdf_to_geojson(gdf))
+    return Response(gdf_to_binary(gdf, media_type), media_type=media_type)
@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import time
+import uuid
+import cProfile
+import inspect
+import resource
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+import shapely
+import numpy as np
+import geopandas as gpd
+from loguru import logger
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from starlette.datastructures import Headers
+from .const import DATA_PATH, PROFILING
+
+PROFILES_PATH = os.path.join(DATA_PATH, 'profiles')
+# Server-Timing header of a request keeps only the longest stages
+SERVER_TIMING_MAX_ENTRIES = 30
+
+STAGE_SECONDS = Histogram(
+    'stage_duration_seconds', 'Duration of pipeline stages and Urban API calls', ['service', 'stage'],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, float('inf'))
+)
+STAGE_FEATURES = Counter('stage_input_features', 'Geometries passed to pipeline stages', ['service', 'stage'])
+STAGE_VERTICES = Counter('stage_input_vertices', 'Vertices of geometries passed to pipeline stages', ['service', 'stage'])
+STAGE_MEMORY = Histogram(
+    'stage_peak_memory_increase_bytes', 'Growth of the process peak RSS during pipeline stages', ['service', 'stage'],
+    buckets=tuple(2 ** i * 1024 * 1024 for i in range(0, 14, 2)) + (float('inf'),)
+)
+STAGE_ERRORS = Counter('stage_errors', 'Pipeline stages and Urban API calls which raised an exception', ['service', 'stage'])
+
+# spans of the current request for its Server-Timing header and id of the thread profiling it
+_request_spans : ContextVar[list | None] = ContextVar('request_spans', default=None)
+_request_id : ContextVar[str | None] = ContextVar('request_id', default=None)
+_profiled_thread : ContextVar[int | None] = ContextVar('profiled_thread', default=None)
+
+def _get_peak_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def _get_input_size(inputs) -> tuple[int, int]:
+    features, vertices = 0, 0
+    for value in inputs:
+        if isinstance(value, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            geometries = value.geometry.values.to_numpy()
+        elif isinstance(value, shapely.Geometry):
+            geometries = np.array([value])
+        else:
+            continue
+        features += len(geometries)
+        vertices += int(shapely.get_num_coordinates(geometries).sum())
+    return features, vertices
+
+@contextmanager
+def _profile(service : str, stage : str):
+    # every thread of a profiled request profiles its outermost stage, since cProfile only sees its own thread
+    thread_id = threading.get_ident()
+    request_id = _request_id.get()
+    if request_id is None or _profiled_thread.get() == thread_id:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # another profiler is active in the process (Python 3.12+ allows only one)
+        logger.warning(f'Cannot profile {service}.{stage}: {e}')
+        yield
+        return
+    token = _profiled_thread.set(thread_id)
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profiled_thread.reset(token)
+        os.makedirs(PROFILES_PATH, exist_ok=True)
+        path = os.path.join(PROFILES_PATH, f'{request_id}_{service}.{stage}_{thread_id}.prof')
+        profiler.dump_stats(path)
+        logger.info(f'Profile of {service}.{stage} is written to {path}')
+
+@contextmanager
+def span(service : str, stage : str, inputs : tuple = ()):
+    """
+    Records duration, input size and peak memory growth of a pipeline stage.
+
+    Parameters
+    ----------
+    service : str
+        Service the stage belongs to, e.g. ``network``.
+    stage : str
+        Name of the stage.
+    inputs : tuple
+        Stage inputs, sizes of GeoDataFrames, GeoSeries and geometries among them are recorded.
+
+    Notes
+    -----
+    - Durations are exposed as Prometheus metrics and added to the ``Server-Timing`` header of the request.
+    - Memory is measured as the growth of the process peak RSS, so concurrent stages share it.
+    - Stages running in other processes (jobs, network parts) are only recorded in metrics of these processes.
+    """
+    features, vertices = _get_input_size(inputs)
+    STAGE_FEATURES.labels(service, stage).inc(features)
+    STAGE_VERTICES.labels(service, stage).inc(vertices)
+    peak_rss = _get_peak_rss()
+    start = time.perf_counter()
+    try:
+        with _profile(service, stage):
+            yield
+    except Exception:
+        STAGE_ERRORS.labels(service, stage).inc()
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(service, stage).observe(seconds)
+        STAGE_MEMORY.labels(service, stage).observe(_get_peak_rss() - peak_rss)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((service, stage, seconds))
+
+def trace(func):
+    """
+    A decorator recording every call of a sync or async function as a `span` of its module service.
+
+    The service is the module name without ``_service`` suffix, the stage is the function name.
+    Sizes of geometry arguments are recorded as the stage input size.
+
+    Examples
+    --------
+    ```
+    @tracing.trace
+    def _split_lines(lines_gdf):
+        ...
+    ```
+    """
+    service = func.__module__.split('.')[-1].removesuffix('_service')
+    stage = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with span(service, stage, (*args, *kwargs.values())):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(service, stage, (*args, *kwargs.values())):
+            return func(*args, **kwargs)
+    return wrapper
+
+def get_metrics() -> tuple[bytes, str]:
+    """Prometheus metrics of the process and their content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def _get_server_timing(spans : list[tuple[str, str, float]]) -> str:
+    # repeated stages are summed up
+    durations = {}
+    counts = {}
+    for service, stage, seconds in spans:
+        name = f'{service}.{stage}'
+        durations[name] = durations.get(name, 0) + seconds
+        counts[name] = counts.get(name, 0) + 1
+    names = sorted(durations, key=durations.get, reverse=True)[:SERVER_TIMING_MAX_ENTRIES]
+    return ', '.join(
+        f'{re.sub(r"[^A-Za-z0-9_-]", "_", name)};desc="{name} x{counts[name]}";dur={durations[name] * 1000:.1f}'
+        for name in names
+    )
+
+class TracingMiddleware:
+    """
+    Collects spans of every HTTP request and reports them in the ``Server-Timing`` response header.
+
+    If `PROFILING` is set in env, requests with ``X-Profile`` header are profiled with cProfile
+    and the stats of every profiled thread are written to ``DATA_PATH/profiles``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        spans = []
+        spans_token = _request_spans.set(spans)
+        profile = PROFILING and 'x-profile' in Headers(scope=scope)
+        request_id_token = _request_id.set(uuid.uuid4().hex if profile else None)
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start' and len(spans) > 0:
+                headers = [*message.get('headers', []), (b'server-timing', _get_server_timing(spans).encode())]
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(spans_token)
+            _request_id.reset(request_id_token)
@@ -1,10 +1,11 @@
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 from api.utils.const import API_TITLE, API_DESCRIPTION
-from api.routers.network import network_controller
+from api.utils import api_client, jobs, results_cache, tracing
+from api.routers.network import network_controller, network_service
 from api.routers.blocks import blocks_controller
 from api.routers.land_use import land_use_controller
 from api.routers.indicators import indicators_controller
@@ -12,10 +13,12 @@ from api.routers.indicators import indicators_controller
 controllers = [network_controller, blocks_controller, land_use_controller, indicators_controller]
 
 async def on_startup():
-    ...
+    api_client.open_clients()
 
 async def on_shutdown():
-    ...
+    await api_client.close_clients()
+    jobs.shutdown_jobs_manager()
+    network_service.shutdown_parts_executor()
 
 @asynccontextmanager
 async def lifespan(router : FastAPI):
@@ -29,6 +32,20 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# identical requests to deterministic endpoints are answered from cache, network generation is deterministic
+# only with a seed and warm started land use depends on previous requests
+app.add_middleware(
+    results_cache.ResultsCacheMiddleware,
+    paths={
+        '/land_use/generate': lambda params : results_cache.is_false(params.get('warm_start', 'false')),
+        '/blocks/generate': lambda params : True,
+        '/network/generate': lambda params : 'seed' in params,
+    }
+)
+
+# stages durations of every request are reported in Server-Timing header
+app.add_middleware(tracing.TracingMiddleware)
+
 # disable cors
 app.add_middleware(
     CORSMiddleware,
@@ -43,5 +60,23 @@ app.add_middleware(GZipMiddleware, minimum_size=100)
 async def read_root():
     return RedirectResponse('/docs')
 
+@app.get("/cache_stats", include_in_schema=False)
+async def cache_stats():
+    return {
+        'urban_api': api_client.cache.stats(),
+        'results': results_cache.cache.stats(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, media_type = tracing.get_metrics()
+    return Response(content, media_type=media_type)
+
+@app.get("/network_stats", include_in_schema=False)
+async def network_stats():
+    return {
+        'streets': network_service.streets_stats.stats(),
+    }
+
 for controller in controllers:
     app.include_router(controller.router)
\ No newline at end of file
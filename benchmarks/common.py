@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+os.environ.setdefault('DATA_PATH', os.path.join(os.path.dirname(__file__), '..', 'app', 'data'))
+os.environ.setdefault('URBAN_API', 'http://localhost:5300')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import numpy as np
+import shapely
+import geopandas as gpd
+
+def random_lines_gdf(n_lines : int, extent : float, seed : int = 0, crs = 32636) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(0, extent, (n_lines, 2))
+    angles = rng.uniform(0, np.pi, n_lines)
+    lengths = rng.uniform(extent / 50, extent / 10, n_lines)
+    ends = starts + np.column_stack([np.cos(angles), np.sin(angles)]) * lengths[:, None]
+    lines = shapely.linestrings(np.stack([starts, ends], axis=1))
+    return gpd.GeoDataFrame(geometry=lines, crs=crs)
+
+def measure(func, *args, repeat : int = 3, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def random_polygons_gdf(n_polygons : int, extent : float, seed : int = 0, crs = 32636) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    centers = shapely.points(rng.uniform(0, extent, (n_polygons, 2)))
+    radiuses = rng.uniform(extent / n_polygons ** 0.5 / 4, extent / n_polygons ** 0.5, n_polygons)
+    return gpd.GeoDataFrame(geometry=shapely.buffer(centers, radiuses, quad_segs=4), crs=crs)
+
+def random_partition_gdf(n_polygons : int, extent : float, seed : int = 0, crs = 32636) -> gpd.GeoDataFrame:
+    # Voronoi cells covering the extent without gaps and overlaps, like functional zones of a city
+    rng = np.random.default_rng(seed)
+    points = shapely.multipoints(rng.uniform(0, extent, (n_polygons, 2)))
+    bbox = shapely.box(0, 0, extent, extent)
+    cells = shapely.get_parts(shapely.voronoi_polygons(points, extend_to=bbox))
+    return gpd.GeoDataFrame(geometry=shapely.intersection(cells, bbox), crs=crs)
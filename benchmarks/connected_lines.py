@@ -0,0 +1,20 @@
+"""
+Benchmark of `network_service._get_connected_and_unconnected_lines` scaling with the number of lines.
+
+Usage: ``python -m benchmarks.connected_lines``
+"""
+from .common import random_lines_gdf, measure
+from api.routers.network import network_service
+
+EXTENT = 5_000
+N_LINES = [500, 1_000, 2_000, 5_000]
+
+def main():
+    for n_lines in N_LINES:
+        # noded network with a part of endpoints snapped together, like the final network
+        lines_gdf = network_service._snap_endpoints(network_service._split_lines(random_lines_gdf(n_lines, EXTENT)), tolerance=5)
+        seconds = measure(network_service._get_connected_and_unconnected_lines, lines_gdf)
+        print(f'{len(lines_gdf):>6} lines: {seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
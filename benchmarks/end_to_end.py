@@ -0,0 +1,187 @@
+"""
+End-to-end benchmark of the services on synthetic territories from 1 to 500 km² with the Urban API
+replaced by the local stand-in from `benchmarks.urban_api`.
+
+Every case runs in a fresh process, so its peak memory and caches don't depend on other cases.
+Stages are timed by the log messages of the services: a stage lasts until the next message.
+Results are written as JSON, which may be compared with the results of another commit to flag regressions.
+
+Usage: ``python -m benchmarks.end_to_end [--services network blocks] [--sizes 1 25] [--output results.json] [--baseline baseline.json]``
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import platform
+import resource
+import argparse
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from . import urban_api
+
+SERVICES = ['network', 'blocks', 'land_use', 'indicators']
+SIZES = [1, 5, 25, 100, 500]
+MAX_ITER = 100
+PROFILE_ID = 1
+TOKEN = 'benchmark'
+# cases slower or using more memory than the baseline by this share and by at least the minimum are regressions
+REGRESSION_THRESHOLD = 0.2
+MIN_SECONDS_REGRESSION = 0.5
+MIN_MEMORY_REGRESSION = 50
+
+def _get_peak_rss_mb(who : int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == 'darwin' else maxrss / 1024
+
+def _get_case(service : str, area_km2 : int, max_iter : int):
+    # inputs are prepared before the run, so only the service is timed
+    if service == 'network':
+        from api.routers.network import network_service
+        return {}, lambda : network_service.generate_network(area_km2, TOKEN, seed=0)
+
+    if service == 'blocks':
+        from api.routers.blocks import blocks_service
+        roads_gdf = urban_api.get_roads_gdf(area_km2)
+        return {'roads': len(roads_gdf)}, lambda : blocks_service.generate_blocks(area_km2, TOKEN, roads_gdf)
+
+    if service == 'land_use':
+        from api.routers.land_use import land_use_service
+        roads_gdf = urban_api.get_roads_gdf(area_km2)
+        zones_gdf = urban_api.get_functional_zones_gdf(area_km2)
+        return {'roads': len(roads_gdf), 'zones': len(zones_gdf)}, lambda : land_use_service.generate_land_use(area_km2, PROFILE_ID, roads_gdf, zones_gdf, True, max_iter, TOKEN)
+
+    if service == 'indicators':
+        from api.utils import api_client
+        from api.routers.indicators import indicators_service
+        async def predict_indicators():
+            try:
+                return await indicators_service.predict_indicators(area_km2, TOKEN)
+            finally:
+                await api_client.close_clients()
+        return {'zones': len(urban_api.get_functional_zones_gdf(area_km2))}, lambda : asyncio.run(predict_indicators())
+
+    raise ValueError(f'Unknown service {service}')
+
+def _get_stages(messages : list[tuple[float, str]], end : float) -> list[dict]:
+    stages = []
+    for i, (timestamp, message) in enumerate(messages):
+        next_timestamp = messages[i + 1][0] if i + 1 < len(messages) else end
+        stages.append({'stage': message.splitlines()[0][:100], 'seconds': round(next_timestamp - timestamp, 4)})
+    return stages
+
+def _run_case(service : str, area_km2 : int, max_iter : int) -> dict:
+    # executed in a fresh process
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    messages = []
+    logger.add(lambda message : messages.append((message.record['time'].timestamp(), message.record['message'])), level='INFO')
+
+    input_size, run = _get_case(service, area_km2, max_iter)
+    rss_before = _get_peak_rss_mb()
+    error = None
+    start = time.time()
+    try:
+        run()
+    except Exception as e:
+        error = repr(e)
+    end = time.time()
+    peak_rss = _get_peak_rss_mb()
+
+    return {
+        'service': service,
+        'area_km2': area_km2,
+        'input': input_size,
+        'seconds': round(end - start, 4),
+        'stages': _get_stages(messages, end),
+        'peak_rss_mb': round(peak_rss, 1),
+        'peak_rss_increase_mb': round(peak_rss - rss_before, 1),
+        'children_peak_rss_mb': round(_get_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        'error': error,
+    }
+
+def _get_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(services : list[str], sizes : list[int], max_iter : int = MAX_ITER) -> dict:
+    server = urban_api.serve()
+    # the processes of cases inherit the environment, responses are not cached on disk between them
+    os.environ['URBAN_API'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ['URBAN_API_CACHE_DISK'] = ''
+    results = []
+    try:
+        for service in services:
+            for area_km2 in sizes:
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    try:
+                        result = executor.submit(_run_case, service, area_km2, max_iter).result()
+                    except Exception as e:
+                        result = {'service': service, 'area_km2': area_km2, 'error': repr(e)}
+                results.append(result)
+                print(f'{service:>10} {area_km2:>4} km²: {result.get("seconds", float("nan")):.3f} s, {result.get("peak_rss_mb", float("nan")):.0f} MB' + (f', {result["error"]}' if result['error'] else ''), file=sys.stderr)
+    finally:
+        server.shutdown()
+    return {
+        'commit': _get_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'max_iter': max_iter,
+        'results': results,
+    }
+
+def compare(report : dict, baseline : dict, threshold : float = REGRESSION_THRESHOLD) -> list[str]:
+    """Returns descriptions of cases which are slower or use more memory than in the baseline."""
+    baseline_results = {(r['service'], r['area_km2']) : r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        base = baseline_results.get((result['service'], result['area_km2']))
+        if base is None or base.get('error') is not None:
+            continue
+        case = f'{result["service"]} {result["area_km2"]} km²'
+        if result.get('error') is not None:
+            regressions.append(f'{case}: fails with {result["error"]}')
+            continue
+        seconds, base_seconds = result['seconds'], base['seconds']
+        if seconds > base_seconds * (1 + threshold) and seconds - base_seconds > MIN_SECONDS_REGRESSION:
+            regressions.append(f'{case}: {seconds:.3f} s instead of {base_seconds:.3f} s')
+        memory, base_memory = result['peak_rss_increase_mb'], base['peak_rss_increase_mb']
+        if memory > base_memory * (1 + threshold) and memory - base_memory > MIN_MEMORY_REGRESSION:
+            regressions.append(f'{case}: {memory:.0f} MB instead of {base_memory:.0f} MB')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of the services')
+    parser.add_argument('--services', nargs='+', choices=SERVICES, default=SERVICES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES, help='territories areas in km²')
+    parser.add_argument('--max-iter', type=int, default=MAX_ITER, help='land use optimizer evaluations')
+    parser.add_argument('--output', help='JSON results path, printed if not provided')
+    parser.add_argument('--baseline', help='JSON results of another commit to compare with')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(args.services, args.sizes, args.max_iter)
+    if args.output is None:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""
+Benchmark of `network_service._find_intersections_and_create_lines` scaling with the number of lines.
+
+Usage: ``python -m benchmarks.find_intersections``
+"""
+from .common import random_lines_gdf, random_polygons_gdf, measure
+from api.routers.network import network_service
+
+EXTENT = 5_000
+N_LINES = [500, 1_000, 2_000, 5_000, 10_000]
+
+def main():
+    for n_lines in N_LINES:
+        lines_gdf = random_lines_gdf(n_lines, EXTENT)
+        polygons_gdf = random_polygons_gdf(n_lines // 5, EXTENT)
+        seconds = measure(network_service._find_intersections_and_create_lines, lines_gdf, polygons_gdf)
+        print(f'{n_lines:>6} lines, {len(polygons_gdf):>5} polygons: {seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+Benchmark of `indicators.get_indicators` scaling with the number of functional zones.
+
+Usage: ``python -m benchmarks.indicators``
+"""
+import numpy as np
+from .common import random_polygons_gdf, measure
+from api.routers.indicators.indicators import get_indicators, LandUse
+
+N_ZONES = [10_000, 50_000, 100_000]
+
+def main():
+    land_uses = np.array([lu.value for lu in LandUse] + [None], dtype=object)
+    for n_zones in N_ZONES:
+        zones_gdf = random_polygons_gdf(n_zones, extent=n_zones ** 0.5 * 100)
+        zones_gdf['land_use'] = np.random.default_rng(0).choice(land_uses, n_zones)
+        seconds = measure(get_indicators, zones_gdf, 'land_use', None, None)
+        print(f'{n_zones:>7} zones: {seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
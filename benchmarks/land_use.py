@@ -0,0 +1,42 @@
+"""
+Benchmark and parity check of `land_use_service._intersect_land_use` against `lu_igi` ``process_land_use``
+on city-scale zones layers.
+
+Blocks with another land use than ``process_land_use`` assigns are reported, blocks with equal shares
+of several land uses are counted separately since any of them may be chosen.
+
+Usage: ``python -m benchmarks.land_use``
+"""
+import numpy as np
+from .common import random_polygons_gdf, random_partition_gdf, measure
+from api.routers.land_use import land_use_service
+from lu_igi.preprocessing.land_use import process_land_use
+
+# numbers of zones and blocks
+SIZES = [(500, 5_000), (2_000, 30_000), (5_000, 100_000)]
+EXTENT = 20_000
+
+def _get_zones_gdf(n_zones : int):
+    zones_gdf = random_partition_gdf(n_zones, EXTENT, seed=1)
+    zones_gdf['zone'] = np.random.default_rng(1).choice(list(land_use_service.LAND_USE_MAPPING) + [8, 9], n_zones)
+    return zones_gdf
+
+def _count_mismatches(result_gdf, expected_gdf, shares) -> tuple[int, int]:
+    ties = np.isclose(shares, shares.max(axis=1, keepdims=True)).sum(axis=1) > 1
+    mismatches = result_gdf['land_use'].to_numpy() != expected_gdf['land_use'].to_numpy()
+    return int((mismatches & ~ties).sum()), int((mismatches & ties).sum())
+
+def main():
+    for n_zones, n_blocks in SIZES:
+        zones_gdf = _get_zones_gdf(n_zones)
+        blocks_gdf = random_polygons_gdf(n_blocks, EXTENT, seed=2)
+        result_gdf = land_use_service._intersect_land_use(blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING)
+        expected_gdf = process_land_use(blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING, min_intersection_share=land_use_service.MIN_INTERSECTION_SHARE)
+        shares = land_use_service._get_land_use_shares(blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING)
+        mismatches, ties = _count_mismatches(result_gdf, expected_gdf, shares)
+        seconds = measure(land_use_service._intersect_land_use, blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING)
+        expected_seconds = measure(process_land_use, blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING, min_intersection_share=land_use_service.MIN_INTERSECTION_SHARE)
+        print(f'{n_zones:>5} zones, {n_blocks:>6} blocks: {seconds:.3f} s, process_land_use {expected_seconds:.3f} s, {mismatches} mismatches, {ties} ties')
+
+if __name__ == '__main__':
+    main()
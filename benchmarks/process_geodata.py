@@ -0,0 +1,25 @@
+"""
+Benchmark of `network_service._process_geodata` scaling with the number of boundary polygons.
+
+Usage: ``python -m benchmarks.process_geodata``
+"""
+import shapely
+import geopandas as gpd
+from .common import random_lines_gdf, random_partition_gdf, measure
+from api.routers.network import network_service
+
+EXTENT = 5_000
+N_POLYGONS = [100, 500, 1_000, 2_000, 5_000]
+
+def main():
+    territory_gdf = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, EXTENT, EXTENT)], crs=32636)
+    for n_polygons in N_POLYGONS:
+        split_territory = random_partition_gdf(n_polygons, EXTENT)
+        split_territory.geometry = split_territory.buffer(-2)
+        lines_gdf = random_lines_gdf(n_polygons * 5, EXTENT)
+        # every polygon is within the buffer distance from the boundary
+        seconds = measure(network_service._process_geodata, territory_gdf, lines_gdf, split_territory, buffer_distance=EXTENT)
+        print(f'{n_polygons:>6} polygons, {len(lines_gdf):>6} lines: {seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
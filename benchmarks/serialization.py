@@ -0,0 +1,21 @@
+"""
+Benchmark of GeoJSON serialization of blocks compared to the ``json.loads(gdf.to_json())`` round trip.
+
+Usage: ``python -m benchmarks.serialization``
+"""
+import json
+from .common import random_polygons_gdf, measure
+from api.utils.serialization import gdf_to_geojson
+
+N_BLOCKS = [1_000, 10_000, 50_000]
+
+def main():
+    for n_blocks in N_BLOCKS:
+        blocks_gdf = random_polygons_gdf(n_blocks, extent=n_blocks ** 0.5 * 100).to_crs(4326)
+        blocks_gdf['land_use'] = 'residential'
+        old_seconds = measure(lambda : json.loads(blocks_gdf.to_json()))
+        new_seconds = measure(gdf_to_geojson, blocks_gdf)
+        print(f'{n_blocks:>6} blocks: to_json {old_seconds:.3f} s, gdf_to_geojson {new_seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+"""
+Benchmark of `network_service._snap_endpoints` scaling with the number of segments.
+
+Usage: ``python -m benchmarks.snap_endpoints``
+"""
+from .common import random_lines_gdf, measure
+from api.routers.network import network_service
+
+N_SEGMENTS = [1_000, 10_000, 50_000, 100_000]
+TOLERANCE = 0.2
+
+def main():
+    for n_segments in N_SEGMENTS:
+        lines_gdf = random_lines_gdf(n_segments, extent=n_segments ** 0.5 * 10)
+        seconds = measure(lambda : network_service._snap_endpoints(lines_gdf.copy(), TOLERANCE))
+        print(f'{n_segments:>7} segments: {seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
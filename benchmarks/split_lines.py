@@ -0,0 +1,18 @@
+"""
+Benchmark of `network_service._split_lines` scaling with the number of lines.
+
+Usage: ``python -m benchmarks.split_lines``
+"""
+from .common import random_lines_gdf, measure
+from api.routers.network import network_service
+
+N_LINES = [100, 250, 500, 1_000, 2_000]
+
+def main():
+    for n_lines in N_LINES:
+        lines_gdf = random_lines_gdf(n_lines, extent=5_000)
+        seconds = measure(network_service._split_lines, lines_gdf)
+        print(f'{n_lines:>6} lines: {seconds:.3f} s')
+
+if __name__ == '__main__':
+    main()
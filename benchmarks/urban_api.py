@@ -0,0 +1,95 @@
+"""
+Local stand-in of the Urban API serving synthetic territories for end-to-end benchmarks.
+
+A project (and a scenario of it) with id ``N`` is a square territory of ``N`` km² with functional zones
+covering it. The data only depends on the id, so benchmarks of different commits get the same input.
+"""
+import json
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import numpy as np
+import shapely
+import geopandas as gpd
+from .common import random_partition_gdf
+
+LOCAL_CRS = 32636
+# south-west corner of territories in LOCAL_CRS, near Saint Petersburg
+ORIGIN = (350_000, 6_630_000)
+ZONES_PER_KM2 = 20
+# ids and names of functional zone types, names are land uses known by the services
+ZONE_TYPES = {
+    1 : 'residential',
+    2 : 'recreation',
+    3 : 'special',
+    4 : 'industrial',
+    5 : 'agriculture',
+    6 : 'transport',
+    7 : 'business',
+}
+FUNCTIONAL_ZONES_SOURCE = {'source': 'OSM', 'year': 2024}
+
+def get_territory_geometry(area_km2 : int) -> shapely.Polygon:
+    side = area_km2 ** 0.5 * 1_000
+    x, y = ORIGIN
+    return shapely.box(x, y, x + side, y + side)
+
+@lru_cache
+def get_functional_zones_gdf(area_km2 : int) -> gpd.GeoDataFrame:
+    """Functional zones covering the territory of `area_km2` in EPSG:4326."""
+    side = area_km2 ** 0.5 * 1_000
+    n_zones = max(area_km2 * ZONES_PER_KM2, 2)
+    zones_gdf = random_partition_gdf(n_zones, side, seed=area_km2, crs=LOCAL_CRS)
+    zones_gdf.geometry = zones_gdf.translate(*ORIGIN)
+    types_ids = np.random.default_rng(area_km2).choice(list(ZONE_TYPES), n_zones)
+    zones_gdf['functional_zone_type'] = [{'id': int(i), 'name': ZONE_TYPES[i], 'nickname': ZONE_TYPES[i]} for i in types_ids]
+    return zones_gdf.to_crs(4326)
+
+def get_roads_gdf(area_km2 : int, spacing : float = 250) -> gpd.GeoDataFrame:
+    """Grid of roads with `spacing` meters between them over the territory of `area_km2` in EPSG:4326."""
+    minx, miny, maxx, maxy = get_territory_geometry(area_km2).bounds
+    xs = np.arange(minx + spacing, maxx, spacing)
+    ys = np.arange(miny + spacing, maxy, spacing)
+    lines = [shapely.LineString([(x, miny), (x, maxy)]) for x in xs] + [shapely.LineString([(minx, y), (maxx, y)]) for y in ys]
+    return gpd.GeoDataFrame(geometry=lines, crs=LOCAL_CRS).to_crs(4326)
+
+def _get_territory_json(area_km2 : int) -> dict:
+    geometry = gpd.GeoSeries([get_territory_geometry(area_km2)], crs=LOCAL_CRS).to_crs(4326).iloc[0]
+    return {'project_id': area_km2, 'geometry': json.loads(shapely.to_geojson(geometry))}
+
+def _get_response(path : str):
+    parts = path.strip('/').split('/')
+    match parts:
+        case ['api', 'v1', 'projects', project_id, 'territory']:
+            return _get_territory_json(int(project_id))
+        case ['api', 'v1', 'scenarios', scenario_id]:
+            return {'scenario_id': int(scenario_id), 'project': {'project_id': int(scenario_id)}}
+        case ['api', 'v1', 'scenarios', _, 'functional_zone_sources']:
+            return [FUNCTIONAL_ZONES_SOURCE]
+        case ['api', 'v1', 'scenarios', scenario_id, 'functional_zones']:
+            return json.loads(get_functional_zones_gdf(int(scenario_id)).to_json())
+        case ['api', 'v1', 'functional_zones_types']:
+            return [{'functional_zone_type_id': i, 'name': name, 'zone_nickname': name} for i, name in ZONE_TYPES.items()]
+    return None
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = _get_response(urlparse(self.path).path)
+        content = json.dumps(body).encode()
+        self.send_response(404 if body is None else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+def serve(host : str = '127.0.0.1', port : int = 0) -> ThreadingHTTPServer:
+    """Starts the stand-in in a daemon thread, its url is ``f'http://{host}:{server.server_port}'``."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the settings are read when the app modules are imported
+os.environ.setdefault('DATA_PATH', tempfile.mkdtemp(prefix='optimizer-api-tests-'))
+os.environ.setdefault('URBAN_API', 'http://127.0.0.1:9')
+sys.path[:0] = [os.path.join(ROOT_PATH, 'app'), ROOT_PATH]
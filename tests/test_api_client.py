@@ -0,0 +1,152 @@
+"""
+Urban API client is checked against the local stand-in from `benchmarks.urban_api`.
+"""
+import socket
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+from fastapi import HTTPException
+from benchmarks import urban_api
+from api.utils import api_client
+
+class _Handler(urban_api._Handler):
+    # counts connections and answers 503 to the first `server.failures` requests
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.requests <= self.server.failures
+        if not fail:
+            return super().do_GET()
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = 0
+    server.failures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    # backoff delays are recorded instead of waited for
+    sleeps = []
+    async def async_sleep(seconds):
+        sleeps.append(seconds)
+    monkeypatch.setattr(api_client.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(api_client.asyncio, 'sleep', async_sleep)
+    return sleeps
+
+def _use_url(monkeypatch, url : str):
+    monkeypatch.setattr(api_client, 'URBAN_API', url)
+    monkeypatch.setattr(api_client, 'URBAN_API_RETRIES', 3)
+    monkeypatch.setattr(api_client, 'URBAN_API_BACKOFF', 0.5)
+    monkeypatch.setattr(api_client, 'cache', api_client.BytesCache(1024 * 1024))
+    asyncio.run(api_client.close_clients())
+
+@pytest.fixture
+def url(monkeypatch, server) -> str:
+    url = f'http://127.0.0.1:{server.server_port}'
+    _use_url(monkeypatch, url)
+    yield url
+    asyncio.run(api_client.close_clients())
+
+@pytest.fixture
+def closed_url(monkeypatch) -> str:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        url = f'http://127.0.0.1:{s.getsockname()[1]}'
+    _use_url(monkeypatch, url)
+    yield url
+    asyncio.run(api_client.close_clients())
+
+def test_connection_reuse(url, server):
+    for project_id in range(1, 6):
+        assert api_client.get_project_by_id(project_id, None)['project_id'] == project_id
+    assert server.connections == 1
+
+def test_connection_reuse_async(url, server):
+    async def get_projects():
+        try:
+            for project_id in range(1, 6):
+                assert (await api_client.get_project_by_id_async(project_id, None))['project_id'] == project_id
+        finally:
+            await api_client.close_clients()
+    asyncio.run(get_projects())
+    assert server.connections == 1
+
+def test_responses_cached(url, server):
+    for _ in range(3):
+        api_client.get_functional_zones_types()
+    assert server.requests == 1
+
+def test_responses_cached_async(url, server):
+    async def get_types():
+        try:
+            for _ in range(3):
+                await api_client.get_functional_zones_types_async()
+        finally:
+            await api_client.close_clients()
+    asyncio.run(get_types())
+    assert server.requests == 1
+
+def test_retry_with_backoff(url, server, sleeps):
+    server.failures = 2
+    assert api_client.get_scenario_by_id(1, None)['scenario_id'] == 1
+    assert server.requests == 3
+    assert sleeps == [0.5, 1.0]
+
+def test_retry_with_backoff_async(url, server, sleeps):
+    server.failures = 2
+    async def get_scenario():
+        try:
+            return await api_client.get_scenario_by_id_async(1, None)
+        finally:
+            await api_client.close_clients()
+    assert asyncio.run(get_scenario())['scenario_id'] == 1
+    assert server.requests == 3
+    assert sleeps == [0.5, 1.0]
+
+def test_retries_exhausted(url, server, sleeps):
+    server.failures = 10
+    with pytest.raises(HTTPException) as e:
+        api_client.get_scenario_by_id(1, None)
+    assert e.value.status_code == 503
+    assert server.requests == 4
+    assert sleeps == [0.5, 1.0, 2.0]
+
+def test_not_found_not_retried(url, server, sleeps):
+    with pytest.raises(HTTPException) as e:
+        api_client._get('/api/v1/unknown')
+    assert e.value.status_code == 404
+    assert server.requests == 1
+    assert sleeps == []
+
+def test_transport_error(closed_url, sleeps):
+    with pytest.raises(HTTPException) as e:
+        api_client.get_project_by_id(1, None)
+    assert e.value.status_code == 502
+    assert sleeps == [0.5, 1.0, 2.0]
+
+def test_transport_error_async(closed_url, sleeps):
+    async def get_project():
+        try:
+            return await api_client.get_project_by_id_async(1, None)
+        finally:
+            await api_client.close_clients()
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(get_project())
+    assert e.value.status_code == 502
+    assert sleeps == [0.5, 1.0, 2.0]
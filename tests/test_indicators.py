@@ -0,0 +1,29 @@
+"""
+Indicators are checked against fixtures of the previous implementation, which computed them block by block.
+"""
+import os
+import json
+import pytest
+import shapely
+import geopandas as gpd
+
+indicators = pytest.importorskip('api.routers.indicators.indicators')
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'indicators')
+
+with open(os.path.join(FIXTURES_PATH, 'indicators.json')) as f:
+    FIXTURES = json.load(f)
+
+def _get_blocks_gdf(blocks : dict) -> gpd.GeoDataFrame:
+    # land uses are stored by names, blocks of other land uses are ignored by indicators
+    land_uses = [indicators.LandUse[name].value if name in indicators.LandUse.__members__ else name.lower() for name in blocks['land_uses']]
+    return gpd.GeoDataFrame({'land_use': land_uses}, geometry=shapely.from_wkb(blocks['geometries']), crs=FIXTURES['crs'])
+
+@pytest.mark.parametrize('case', FIXTURES['cases'], ids=lambda case : f'{case["blocks"]}-{case["residential_type"]}-{case["area"]}')
+def test_get_indicators(case):
+    blocks_gdf = _get_blocks_gdf(FIXTURES['blocks'][case['blocks']])
+    residential_type = None if case['residential_type'] is None else indicators.ResidentialType[case['residential_type']]
+    result = indicators.get_indicators(blocks_gdf, 'land_use', residential_type, case['area'])
+    assert result == case['expected']
+    assert [type(v) for v in result.values()] == [type(v) for v in case['expected'].values()]
+    assert list(result) == list(case['expected'])
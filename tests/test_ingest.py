@@ -0,0 +1,89 @@
+import json
+import pytest
+import shapely
+from fastapi.exceptions import RequestValidationError
+from api.utils import ingest
+
+SQUARE = {'type': 'Polygon', 'coordinates': [[[30, 59], [30.01, 59], [30.01, 59.01], [30, 59.01], [30, 59]]]}
+# self-intersecting ring
+BOWTIE = {'type': 'Polygon', 'coordinates': [[[30, 59], [30.01, 59.01], [30.01, 59], [30, 59.01], [30, 59]]]}
+LINE = {'type': 'LineString', 'coordinates': [[30, 59], [30.01, 59.01]]}
+
+def _collection(*geometries, properties : dict | None = None) -> dict:
+    return {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'geometry': g, 'properties': properties or {}} for g in geometries]}
+
+def _errors(data, loc : tuple = ('zones',), geometry_types : tuple = ingest.POLYGON_TYPES, **kwargs) -> list[dict]:
+    with pytest.raises(RequestValidationError) as e:
+        ingest.read_feature_collection(data, loc, geometry_types, **kwargs)
+    return e.value.errors()
+
+def test_read_feature_collection():
+    gdf = ingest.read_feature_collection(_collection(SQUARE, SQUARE, properties={'a': 1}), ('zones',), ingest.POLYGON_TYPES)
+    assert len(gdf) == 2
+    assert gdf.crs.to_epsg() == 4326
+    assert list(gdf['a']) == [1, 1]
+    assert shapely.equals(gdf.geometry.iloc[0], shapely.from_geojson(json.dumps(SQUARE)))
+
+def test_read_empty_feature_collection():
+    gdf = ingest.read_feature_collection(_collection(), ('zones',), ingest.POLYGON_TYPES)
+    assert len(gdf) == 0
+
+def test_not_feature_collection():
+    errors = _errors({'type': 'Feature', 'geometry': SQUARE})
+    assert errors[0]['loc'] == ('body', 'zones')
+
+def test_wrong_geometry_type():
+    errors = _errors(_collection(SQUARE, LINE, None))
+    assert [error['loc'] for error in errors] == [('body', 'zones', 'features', 1, 'geometry'), ('body', 'zones', 'features', 2, 'geometry')]
+    assert errors[0]['msg'] == 'Geometry type should be one of Polygon, MultiPolygon'
+
+def test_wrong_properties():
+    data = _collection(SQUARE)
+    data['features'][0]['properties'] = [1]
+    errors = _errors(data)
+    assert errors[0]['loc'] == ('body', 'zones', 'features', 0, 'properties')
+
+def test_invalid_geometry():
+    errors = _errors(_collection(SQUARE, BOWTIE))
+    assert len(errors) == 1
+    assert errors[0]['loc'] == ('body', 'zones', 'features', 1, 'geometry')
+    assert errors[0]['msg'].startswith('Self-intersection')
+
+def test_invalid_geometry_not_checked():
+    gdf = ingest.read_feature_collection(_collection(SQUARE, BOWTIE), ('zones',), ingest.POLYGON_TYPES, check_validity=False)
+    assert len(gdf) == 2
+
+def test_unreadable_geometry():
+    errors = _errors(_collection({'type': 'Polygon', 'coordinates': [[[30, 59], [30.01]]]}))
+    assert errors[0]['loc'] == ('body', 'zones')
+
+def test_empty_geometry():
+    errors = _errors(_collection(SQUARE, {'type': 'Polygon', 'coordinates': []}))
+    assert errors[0]['loc'] == ('body', 'zones', 'features', 1, 'geometry')
+    assert errors[0]['msg'] == 'Geometry should not be empty'
+
+def test_loads():
+    assert ingest.loads(b'{"a": [1, 2]}') == {'a': [1, 2]}
+
+def test_loads_bad_json():
+    with pytest.raises(RequestValidationError) as e:
+        ingest.loads(b'{"a": [1, 2}')
+    error, = e.value.errors()
+    assert error['type'] == 'json_invalid'
+    assert error['loc'][0] == 'body'
+
+def test_land_use_empty_zones():
+    land_use_controller = pytest.importorskip('api.routers.land_use.land_use_controller')
+    body = json.dumps({'zones': _collection(), 'blocks': _collection(SQUARE)}).encode()
+    with pytest.raises(RequestValidationError) as e:
+        land_use_controller._parse_json_input(body)
+    error, = e.value.errors()
+    assert error['loc'] == ('body', 'zones', 'features')
+
+def test_land_use_zones_without_type():
+    land_use_controller = pytest.importorskip('api.routers.land_use.land_use_controller')
+    body = json.dumps({'zones': _collection(SQUARE), 'blocks': _collection(SQUARE)}).encode()
+    with pytest.raises(RequestValidationError) as e:
+        land_use_controller._parse_json_input(body)
+    error, = e.value.errors()
+    assert error['loc'] == ('body', 'zones', 'features', 0, 'properties', 'functional_zone_type')
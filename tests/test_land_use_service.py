@@ -0,0 +1,28 @@
+"""
+Land use of blocks is checked against ``process_land_use`` of lu_igi, which it replaces.
+"""
+import numpy as np
+import pytest
+
+process_land_use = pytest.importorskip('lu_igi.preprocessing.land_use').process_land_use
+land_use_service = pytest.importorskip('api.routers.land_use.land_use_service')
+from benchmarks.common import random_polygons_gdf, random_partition_gdf
+
+EXTENT = 2_000
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_intersect_land_use(seed):
+    zones_gdf = random_partition_gdf(50, EXTENT, seed=seed)
+    # zones of unknown types are ignored
+    zones_gdf['zone'] = np.random.default_rng(seed).choice(list(land_use_service.LAND_USE_MAPPING) + [8, 9], len(zones_gdf))
+    blocks_gdf = random_polygons_gdf(500, EXTENT, seed=seed)
+
+    result_gdf = land_use_service._intersect_land_use(blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING)
+    expected_gdf = process_land_use(blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING, min_intersection_share=land_use_service.MIN_INTERSECTION_SHARE)
+
+    assert list(result_gdf.columns) == [*blocks_gdf.columns, 'land_use']
+    # blocks with equal shares of several land uses may get any of them
+    shares = land_use_service._get_land_use_shares(blocks_gdf, zones_gdf, land_use_service.LAND_USE_MAPPING)
+    ties = np.isclose(shares, shares.max(axis=1, keepdims=True)).sum(axis=1) > 1
+    mismatches = result_gdf['land_use'].to_numpy() != expected_gdf['land_use'].to_numpy()
+    assert not (mismatches & ~ties).any()
@@ -0,0 +1,63 @@
+"""
+Network stages are checked against fixtures of their previous implementations, so refactoring them
+doesn't silently change generated networks.
+"""
+import os
+import json
+import pytest
+import shapely
+import geopandas as gpd
+from api.routers.network import network_service
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'network')
+
+def _load_cases(file_name : str) -> tuple[int, list[dict]]:
+    with open(os.path.join(FIXTURES_PATH, file_name)) as f:
+        fixtures = json.load(f)
+    return fixtures['crs'], fixtures['cases']
+
+def _gdf(wkb_hexes : list[str], crs : int) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(geometry=shapely.from_wkb(wkb_hexes), crs=crs)
+
+def _assert_geometries_equal(gdf : gpd.GeoDataFrame, expected : list[str]):
+    assert len(gdf) == len(expected)
+    assert shapely.equals_exact(gdf.geometry.values.to_numpy(), shapely.from_wkb(expected), tolerance=0).all()
+
+SPLIT_LINES_CRS, SPLIT_LINES_CASES = _load_cases('split_lines.json')
+PROCESS_GEODATA_CRS, PROCESS_GEODATA_CASES = _load_cases('process_geodata.json')
+SNAP_ENDPOINTS_CRS, SNAP_ENDPOINTS_CASES = _load_cases('snap_endpoints.json')
+
+@pytest.mark.parametrize('case', SPLIT_LINES_CASES, ids=lambda case : case['name'])
+def test_split_lines(case):
+    lines_gdf = _gdf(case['lines'], SPLIT_LINES_CRS)
+    result_gdf = network_service._split_lines(lines_gdf)
+    _assert_geometries_equal(result_gdf, case['expected'])
+
+@pytest.mark.parametrize('case', PROCESS_GEODATA_CASES, ids=lambda case : case['name'])
+def test_process_geodata(case):
+    territory_gdf = _gdf(case['territory'], PROCESS_GEODATA_CRS)
+    lines_gdf = _gdf(case['lines'], PROCESS_GEODATA_CRS)
+    blocks_gdf = _gdf(case['blocks'], PROCESS_GEODATA_CRS)
+    remaining_gdf, pairs_gdf, polygons_gdf = network_service._process_geodata(territory_gdf, lines_gdf, blocks_gdf, case['buffer_distance'])
+    assert list(remaining_gdf.index) == case['expected_remaining']
+    assert list(polygons_gdf.index) == case['expected_polygons']
+    _assert_geometries_equal(pairs_gdf, case['expected_pairs'])
+
+@pytest.mark.parametrize('case', SNAP_ENDPOINTS_CASES, ids=lambda case : case['name'])
+def test_snap_endpoints(case):
+    lines_gdf = _gdf(case['lines'], SNAP_ENDPOINTS_CRS)
+    result_gdf = network_service._snap_endpoints(lines_gdf, tolerance=case['tolerance'])
+    _assert_geometries_equal(result_gdf, case['expected'])
+
+def test_snap_endpoints_ends():
+    # the lines only meet by their end points
+    lines_gdf = gpd.GeoDataFrame(geometry=[
+        shapely.LineString([(0, 0), (10, 10)]),
+        shapely.LineString([(20, 0), (10.1, 10.05)]),
+        shapely.LineString([(0, 20), (10, 9.9)]),
+    ], crs=SNAP_ENDPOINTS_CRS)
+    result_gdf = network_service._snap_endpoints(lines_gdf.copy(), tolerance=0.2)
+    ends = shapely.get_point(result_gdf.geometry.values.to_numpy(), -1)
+    assert shapely.equals_exact(ends, ends[0], tolerance=0).all()
+    starts = shapely.get_point(result_gdf.geometry.values.to_numpy(), 0)
+    assert shapely.equals_exact(starts, shapely.get_point(lines_gdf.geometry.values.to_numpy(), 0), tolerance=0).all()
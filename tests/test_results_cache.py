@@ -0,0 +1,137 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from api.utils import results_cache
+
+def _get_app(calls : list[str]) -> FastAPI:
+    # every call of an endpoint is recorded, so cached responses are told by the calls count
+    app = FastAPI()
+
+    @app.post('/network/generate')
+    async def generate_network(request : Request, seed : int | None = None):
+        calls.append('network')
+        return {'seed': seed, 'calls': len(calls), 'body': (await request.body()).decode()}
+
+    @app.post('/land_use/generate')
+    async def generate_land_use(warm_start : bool = False):
+        calls.append('land_use')
+        return {'warm_start': warm_start, 'calls': len(calls)}
+
+    @app.post('/blocks/generate')
+    async def generate_blocks(status_code : int = 200):
+        calls.append('blocks')
+        return JSONResponse({'calls': len(calls)}, status_code=status_code)
+
+    # the same predicates as the app uses
+    app.add_middleware(
+        results_cache.ResultsCacheMiddleware,
+        paths={
+            '/land_use/generate': lambda params : results_cache.is_false(params.get('warm_start', 'false')),
+            '/blocks/generate': lambda params : True,
+            '/network/generate': lambda params : 'seed' in params,
+        }
+    )
+    return app
+
+@pytest.fixture
+def calls(monkeypatch) -> list[str]:
+    monkeypatch.setattr(results_cache, 'cache', results_cache.BytesCache(1024 * 1024))
+    return []
+
+@pytest.fixture
+def client(calls) -> TestClient:
+    return TestClient(_get_app(calls))
+
+def _multipart(boundary : str) -> tuple[bytes, dict]:
+    body = (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="zones"; filename="zones.parquet"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+        'zones\r\n'
+        f'--{boundary}--\r\n'
+    ).encode()
+    return body, {'content-type': f'multipart/form-data; boundary={boundary}'}
+
+def test_json_keys_order(client, calls):
+    first = client.post('/network/generate?seed=1', content=b'{"a": 1, "b": [1, 2]}', headers={'content-type': 'application/json'})
+    second = client.post('/network/generate?seed=1', content=b'{"b":[1,2],"a":1}', headers={'content-type': 'application/json'})
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.headers['etag'] == second.headers['etag']
+    assert len(calls) == 1
+
+def test_json_bodies_differ(client, calls):
+    client.post('/network/generate?seed=1', json={'a': 1})
+    client.post('/network/generate?seed=1', json={'a': 2})
+    client.post('/network/generate?seed=2', json={'a': 1})
+    assert len(calls) == 3
+
+def test_multipart_boundaries(client, calls):
+    first = client.post('/network/generate?seed=1', content=_multipart('first')[0], headers=_multipart('first')[1])
+    second = client.post('/network/generate?seed=1', content=_multipart('second')[0], headers=_multipart('second')[1])
+    assert first.content == second.content
+    assert len(calls) == 1
+
+def test_tokens_differ(client, calls):
+    client.post('/network/generate?seed=1', json={}, headers={'authorization': 'Bearer a'})
+    client.post('/network/generate?seed=1', json={}, headers={'authorization': 'Bearer b'})
+    assert len(calls) == 2
+
+def test_if_none_match(client, calls):
+    first = client.post('/network/generate?seed=1', json={})
+    etag = first.headers['etag']
+    second = client.post('/network/generate?seed=1', json={}, headers={'if-none-match': etag})
+    assert second.status_code == 304
+    assert second.content == b''
+    assert second.headers['etag'] == etag
+    third = client.post('/network/generate?seed=1', json={}, headers={'if-none-match': '"other"'})
+    assert third.status_code == 200
+    assert third.content == first.content
+    assert len(calls) == 1
+
+def test_errors_not_cached(client, calls):
+    for _ in range(2):
+        response = client.post('/blocks/generate?status_code=500', json={})
+        assert response.status_code == 500
+        assert 'etag' not in response.headers
+    assert len(calls) == 2
+    client.post('/blocks/generate', json={})
+    client.post('/blocks/generate', json={})
+    assert len(calls) == 3
+
+def test_without_seed_not_cached(client, calls):
+    client.post('/network/generate', json={})
+    response = client.post('/network/generate', json={})
+    assert 'etag' not in response.headers
+    assert len(calls) == 2
+
+@pytest.mark.parametrize('warm_start', ['true', 't', 'y', 'on', '1'])
+def test_warm_start_not_cached(client, calls, warm_start):
+    client.post(f'/land_use/generate?warm_start={warm_start}', json={})
+    client.post(f'/land_use/generate?warm_start={warm_start}', json={})
+    assert calls == ['land_use', 'land_use']
+
+def test_invalid_warm_start_not_cached(client, calls):
+    for _ in range(2):
+        response = client.post('/land_use/generate?warm_start=invalid', json={})
+        assert response.status_code == 422
+        assert 'etag' not in response.headers
+
+@pytest.mark.parametrize('warm_start', ['false', 'f', 'n', 'off', '0'])
+def test_cold_start_cached(client, calls, warm_start):
+    client.post(f'/land_use/generate?warm_start={warm_start}', json={})
+    client.post(f'/land_use/generate?warm_start={warm_start}', json={})
+    client.post('/land_use/generate', json={})
+    assert len(calls) == 2
+
+def test_app_predicates():
+    main = pytest.importorskip('main')
+    middleware, = [m for m in main.app.user_middleware if m.cls is results_cache.ResultsCacheMiddleware]
+    paths = middleware.kwargs['paths']
+    assert set(paths) == {'/land_use/generate', '/blocks/generate', '/network/generate'}
+    assert not paths['/land_use/generate']({'warm_start': 't'})
+    assert paths['/land_use/generate']({'warm_start': 'no'})
+    assert paths['/land_use/generate']({})
+    assert not paths['/network/generate']({})
+    assert paths['/network/generate']({'seed': '1'})
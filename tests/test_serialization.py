@@ -0,0 +1,36 @@
+import json
+import numpy as np
+import shapely
+import geopandas as gpd
+from api.utils import serialization
+
+def _get_gdf() -> gpd.GeoDataFrame:
+    geometries = [
+        shapely.Point(30.123456789, 59.987654321),
+        shapely.LineString([(30, 59), (30.1, 59.1), (30.2, 59.05)]),
+        shapely.box(30, 59, 30.1, 59.1),
+        shapely.MultiPolygon([shapely.box(0, 0, 1, 1), shapely.box(2, 2, 3, 3)]),
+        shapely.Polygon(),
+        shapely.LineString(),
+        None,
+    ]
+    n = len(geometries)
+    return gpd.GeoDataFrame({
+        'int': np.arange(n),
+        'float': [0.5, np.nan, 1e-7, 2.0, -1.5, 3.25, 0.0],
+        'str': ['a', None, 'б', 'c', 'd', 'e', 'f'],
+        'bool': [True, False] * 3 + [True],
+    }, geometry=geometries, crs=4326, index=[10, 11, 12, 13, 14, 15, 16])
+
+def test_gdf_to_geojson():
+    gdf = _get_gdf()
+    assert json.loads(serialization.gdf_to_geojson(gdf, grid_size=None)) == json.loads(gdf.to_json())
+
+def test_gdf_to_geojson_grid_size():
+    gdf = _get_gdf()
+    # polygons smaller than the grid collapse to empty
+    gdf.loc[13, 'geometry'] = shapely.box(0, 0, 0.001, 0.001)
+    expected_gdf = gdf.copy()
+    expected_gdf.geometry = shapely.set_precision(gdf.geometry.values.to_numpy(), grid_size=0.01)
+    assert expected_gdf.geometry.is_empty.sum() == 3
+    assert json.loads(serialization.gdf_to_geojson(gdf, grid_size=0.01)) == json.loads(expected_gdf.to_json())